@@ -9,7 +9,6 @@ import json
 from smtplib import SMTPException
 from templated_mail.mail import BaseEmailMessage
 from .utils import generate_otp, validate_otp
-import requests
 import hmac
 import hashlib
 from django.http import JsonResponse
@@ -17,6 +16,7 @@ from store.models import Tenant
 from django.contrib.auth import login
 from django.contrib.auth import get_user_model
 from django.utils.crypto import get_random_string
+from store.shopify import ShopifyClient
 from store.tasks import fetch_existing_data_task, subscribe_to_webhooks_task
 
 
@@ -123,13 +123,12 @@ def shopify_callback(request):
     if not hmac.compare_digest(digest, hmac_param):
         return render(request, "error.html", {"message": "Invalid HMAC."})
 
-    token_url = f"https://{shop}/admin/oauth/access_token"
     payload = {
         "client_id": settings.SHOPIFY_API_KEY,
         "client_secret": settings.SHOPIFY_API_SECRET,
         "code": code,
     }
-    response = requests.post(token_url, json=payload)
+    response = ShopifyClient(shop).post("/admin/oauth/access_token", json=payload)
 
     if response.status_code != 200:
         return render(request, "error.html", {"message": "Failed to get access token."})
@@ -138,9 +137,8 @@ def shopify_callback(request):
 
     user = request.user
     if not user.is_authenticated:
-        shop_url = f"https://{shop}/admin/api/2023-10/shop.json"
-        headers = {"X-Shopify-Access-Token": access_token}
-        shop_response = requests.get(shop_url, headers=headers)
+        client = ShopifyClient(shop, access_token, api_version="2023-10")
+        shop_response = client.get("shop.json")
 
         if shop_response.status_code != 200:
             return render(
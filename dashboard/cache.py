@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from store.data_version import get_data_version
+
+CACHED_VIEWS = ["stats", "orders-by-date", "top-customers"]
+
+
+def response_key(tenant_id, view, params=""):
+    return f"dashboard:{view}:{tenant_id}:{get_data_version(tenant_id)}:{params}"
+
+
+def counter_key(view, outcome):
+    return f"dashboard-cache:{view}:{outcome}"
+
+
+def count(view, outcome):
+    key = counter_key(view, outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def cached_payload(tenant, view, compute, params=""):
+    """Return ``(payload, hit)``, computing and caching the payload on a miss.
+
+    The key carries the tenant's data version, so any write to its store data
+    makes the next request a miss instead of serving the old payload.
+    """
+    key = response_key(tenant.id, view, params)
+    payload = cache.get(key)
+    hit = payload is not None
+    if not hit:
+        payload = compute()
+        cache.set(key, payload, timeout=settings.DASHBOARD_CACHE_TTL)
+
+    count(view, "hits" if hit else "misses")
+    return payload, hit
+
+
+def cache_stats():
+    counters = cache.get_many(
+        [
+            counter_key(view, outcome)
+            for view in CACHED_VIEWS
+            for outcome in ("hits", "misses")
+        ]
+    )
+    stats = {}
+    for view in CACHED_VIEWS:
+        hits = counters.get(counter_key(view, "hits"), 0)
+        misses = counters.get(counter_key(view, "misses"), 0)
+        stats[view] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return stats
@@ -7,4 +7,9 @@ urlpatterns = [
         "api/orders-by-date/", views.OrdersByDateView.as_view(), name="orders-by-date"
     ),
     path("api/top-customers/", views.TopCustomersView.as_view(), name="top-customers"),
+    path(
+        "api/cache-stats/",
+        views.DashboardCacheStatsView.as_view(),
+        name="dashboard-cache-stats",
+    ),
 ]
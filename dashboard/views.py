@@ -2,51 +2,53 @@ from django.shortcuts import render
 from django.views.generic import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from store.models import Customer, Order, Tenant
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncDate
+from store.models import Customer, TenantDailyStats
+from store.tenant_cache import get_tenant_for_user
+from django.db.models import F, Sum
 from datetime import datetime, timedelta
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import status
+from .cache import cache_stats, cached_payload
+
+
+def cached_response(tenant, view, compute, params=""):
+    payload, hit = cached_payload(tenant, view, compute, params)
+    return Response(payload, headers={"X-Dashboard-Cache": "hit" if hit else "miss"})
 
 
 class DashboardStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            tenant = request.user.tenant
-        except Tenant.DoesNotExist:
+        tenant = get_tenant_for_user(request.user)
+        if tenant is None:
             return Response(
                 {"error": "No tenant associated with this user."},
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        total_customers = Customer.objects.filter(tenant=tenant).count()
-        total_orders = Order.objects.filter(tenant=tenant).count()
-        total_revenue = (
-            Order.objects.filter(tenant=tenant).aggregate(
-                total_revenue=Sum("total_price")
-            )["total_revenue"]
-            or 0
-        )
-
-        return Response(
-            {
-                "total_customers": total_customers,
-                "total_orders": total_orders,
-                "total_revenue": total_revenue,
+        def compute():
+            # Summed over one row per day rather than over every order.
+            totals = TenantDailyStats.objects.filter(tenant=tenant).aggregate(
+                total_customers=Sum("new_customers"),
+                total_orders=Sum("orders_count"),
+                total_revenue=Sum("revenue"),
+            )
+            return {
+                "total_customers": totals["total_customers"] or 0,
+                "total_orders": totals["total_orders"] or 0,
+                "total_revenue": totals["total_revenue"] or 0,
             }
-        )
+
+        return cached_response(tenant, "stats", compute)
 
 
 class OrdersByDateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            tenant = request.user.tenant
-        except Tenant.DoesNotExist:
+        tenant = get_tenant_for_user(request.user)
+        if tenant is None:
             return Response(
                 {"error": "No tenant associated with this user."},
                 status=status.HTTP_403_FORBIDDEN,
@@ -63,36 +65,47 @@ class OrdersByDateView(APIView):
         if end_date_str:
             end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
 
-        orders_by_date = (
-            Order.objects.filter(
-                tenant=tenant, created_at__date__range=[start_date, end_date]
+        def compute():
+            return list(
+                TenantDailyStats.objects.filter(
+                    tenant=tenant,
+                    date__range=[start_date, end_date],
+                    orders_count__gt=0,
+                )
+                .values("date", order_count=F("orders_count"))
+                .order_by("date")
             )
-            .annotate(date=TruncDate("created_at"))
-            .values("date")
-            .annotate(order_count=Count("id"))
-            .order_by("date")
-        )
 
-        return Response(orders_by_date)
+        return cached_response(
+            tenant, "orders-by-date", compute, f"{start_date}:{end_date}"
+        )
 
 
 class TopCustomersView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            tenant = request.user.tenant
-        except Tenant.DoesNotExist:
+        tenant = get_tenant_for_user(request.user)
+        if tenant is None:
             return Response(
                 {"error": "No tenant associated with this user."},
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        top_customers = (
-            Customer.objects.filter(tenant=tenant)
-            .annotate(total_spent=Sum("orders__total_price"))
-            .order_by("-total_spent")[:5]
-            .values("first_name", "last_name", "email", "total_spent")
-        )
+        # total_spent is maintained on write, so this walks the
+        # (tenant, -total_spent) index instead of aggregating every order.
+        def compute():
+            return list(
+                Customer.objects.filter(tenant=tenant)
+                .order_by("-total_spent")[:5]
+                .values("first_name", "last_name", "email", "total_spent")
+            )
+
+        return cached_response(tenant, "top-customers", compute)
 
-        return Response(top_customers)
\ No newline at end of file
+
+class DashboardCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
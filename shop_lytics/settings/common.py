@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -150,6 +151,62 @@ DJOSER = {
     },
 }
 
+SHOPIFY_API_VERSION = "2024-07"
+SHOPIFY_TIMEOUT = (5, 30)
+SHOPIFY_POOL_SIZE = 10
+SHOPIFY_SESSION_CACHE_SIZE = 64
+SHOPIFY_CONNECT_RETRIES = 3
+SHOPIFY_BUCKET_SIZE = 40
+SHOPIFY_LEAK_RATE = 2
+SHOPIFY_MAX_RETRIES = 5
+SHOPIFY_PREFETCH_PAGES = 2
+SHOPIFY_ORDER_WINDOW_SIZE = 25000
+SHOPIFY_ORDER_WINDOW_MIN_SPAN = timedelta(hours=1)
+SYNC_LOCK_TIMEOUT = 60 * 60 * 6
+SYNC_CLOCK_SKEW = timedelta(minutes=5)
+
+WEBHOOK_STREAM = "shopify-webhooks"
+WEBHOOK_STREAM_MAXLEN = 1000000
+WEBHOOK_CLAIM_IDLE_MS = 60000
+WEBHOOK_MAX_DELIVERIES = 5
+WEBHOOK_BATCH_SIZE = 500
+WEBHOOK_BATCH_WAIT_MS = 200
+WEBHOOK_DEDUPE_TTL = 60 * 60 * 48
+
+TENANT_CACHE_TTL = 60 * 60
+TENANT_CACHE_LOCAL_TTL = 30
+TENANT_CACHE_LOCAL_SIZE = 1024
+
+# Dashboard responses are keyed by the tenant's data version, so this only
+# bounds how long entries for superseded versions linger in Redis.
+DASHBOARD_CACHE_TTL = 60 * 15
+
+# What happens to the raw Shopify payload of a CustomEvent once its analytics
+# fields are projected into columns: "keep" (JSON), "compress" (zlib) or "drop".
+CUSTOM_EVENT_PAYLOAD_POLICY = {
+    "checkout_started": "compress",
+    "checkout_updated": "drop",
+    "checkout_deleted": "drop",
+}
+CUSTOM_EVENT_PAYLOAD_DEFAULT = "compress"
+
+# Raw events older than this are folded into CustomEventDailyRollup and deleted.
+CUSTOM_EVENT_RETENTION_DAYS = 90
+
+# Parked line items whose product has not synced by then are dropped.
+PENDING_ORDER_ITEM_RETENTION_DAYS = 30
+
+CELERY_BEAT_SCHEDULE = {
+    "rollup-custom-events": {
+        "task": "store.tasks.rollup_custom_events_task",
+        "schedule": crontab(hour=3, minute=15),
+    },
+    "prune-pending-order-items": {
+        "task": "store.tasks.prune_pending_order_items_task",
+        "schedule": crontab(hour=3, minute=45),
+    },
+}
+
 SITE_DOMAIN = "shop-lytics-frontend.onrender.com"
 DOMAIN = SITE_DOMAIN
 SITE_NAME = "Shop Lytics"
@@ -21,6 +21,7 @@ CORS_ALLOWED_ORIGINS = [
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
+CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
 
 DEFAULT_FROM_EMAIL = "YOUR_GMAIL"
 
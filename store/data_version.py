@@ -0,0 +1,38 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def data_version_key(tenant_id):
+    return f"tenant:data-version:{tenant_id}"
+
+
+def get_data_version(tenant_id):
+    key = data_version_key(tenant_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a counter lost to eviction never restarts at
+        # a value that entries from before the eviction were cached under.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def increment_data_version(tenant_id):
+    key = data_version_key(tenant_id)
+    cache.add(key, time.time_ns(), timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between the add and the incr; the next read reseeds it.
+        pass
+
+
+def bump_data_version(tenant_id):
+    """Mark the tenant's store data as changed once the transaction commits.
+
+    Bumping only after the commit keeps a concurrent reader from caching the
+    pre-write data under the new version.
+    """
+    transaction.on_commit(lambda: increment_data_version(tenant_id))
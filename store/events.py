@@ -0,0 +1,56 @@
+import json
+import zlib
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+
+
+def as_decimal(value):
+    try:
+        return Decimal(str(value)) if value is not None else None
+    except InvalidOperation:
+        return None
+
+
+def checkout_projection(data):
+    """Pull the analytics fields of a checkout payload into ``CustomEvent`` columns."""
+    line_items = data.get("line_items")
+    return {
+        "cart_value": as_decimal(data.get("total_price")),
+        "item_count": (
+            sum(item.get("quantity") or 0 for item in line_items)
+            if line_items is not None
+            else None
+        ),
+        "currency": data.get("currency") or data.get("presentment_currency"),
+        "checkout_token": data.get("token"),
+    }
+
+
+def payload_policy(event_type):
+    return settings.CUSTOM_EVENT_PAYLOAD_POLICY.get(
+        event_type, settings.CUSTOM_EVENT_PAYLOAD_DEFAULT
+    )
+
+
+def compress_payload(data):
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+
+
+def decompress_payload(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+def event_fields(event_type, data):
+    """Projected columns plus the payload stored as the event type's policy says.
+
+    ``keep`` leaves it in ``metadata``, ``compress`` moves it to
+    ``compressed_payload`` and ``drop`` discards it.
+    """
+    fields = checkout_projection(data)
+    policy = payload_policy(event_type)
+    fields["metadata"] = data if policy == "keep" else {}
+    fields["compressed_payload"] = (
+        compress_payload(data) if policy == "compress" else None
+    )
+    return fields
@@ -0,0 +1,219 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from store.models import Customer, CustomEvent, Order, Tenant, TenantDailyStats
+from store.utils import (
+    refresh_customer_aggregates,
+    refresh_daily_stats,
+    within_dates,
+)
+
+# Indexes added for these access paths; dropped inside a rolled-back
+# transaction for the "before" run.
+DASHBOARD_INDEXES = [
+    "store_order_tenant_created_idx",
+    "store_event_type_created_idx",
+    "store_customer_top_spent_idx",
+]
+
+
+def dashboard_queries(tenant):
+    today = timezone.localdate()
+    shopify_order_ids = list(
+        Order.objects.filter(tenant=tenant)
+        .order_by("?")
+        .values_list("shopify_order_id", flat=True)[:250]
+    )
+
+    return {
+        "orders_by_date": TenantDailyStats.objects.filter(
+            tenant=tenant,
+            date__range=[today - timedelta(days=30), today],
+            orders_count__gt=0,
+        )
+        .values("date", order_count=F("orders_count"))
+        .order_by("date"),
+        "daily_stats_refresh": Order.objects.filter(
+            within_dates("created_at", [today - timedelta(days=1), today]),
+            tenant=tenant,
+        )
+        .annotate(date=TruncDate("created_at"))
+        .values("date", "currency")
+        .annotate(count=Count("id"), revenue=Sum("total_price")),
+        "top_customers": Customer.objects.filter(tenant=tenant)
+        .order_by("-total_spent")
+        .values("first_name", "last_name", "email", "total_spent")[:5],
+        "dashboard_totals": TenantDailyStats.objects.filter(tenant=tenant)
+        .values("tenant_id")
+        .annotate(
+            total_orders=Sum("orders_count"),
+            total_revenue=Sum("revenue"),
+            total_customers=Sum("new_customers"),
+        ),
+        "recent_checkouts": CustomEvent.objects.filter(
+            tenant=tenant,
+            event_type="checkout_started",
+            created_at__gte=timezone.now() - timedelta(days=7),
+        )
+        .values("tenant_id")
+        .annotate(count=Count("id")),
+        "webhook_order_lookup": Order.objects.filter(
+            tenant=tenant, shopify_order_id__in=shopify_order_ids
+        ).values_list("shopify_order_id", "id"),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Show query plans and latency of the dashboard and webhook lookups with "
+        "and without the tenant-scoped indexes. --seed fills a development "
+        "database with synthetic tenants first; do not run against production, "
+        "the comparison drops indexes inside a transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Create this many orders per synthetic tenant before measuring.",
+        )
+        parser.add_argument("--tenants", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--shop-domain", help="Tenant to query; defaults to the seeded one"
+        )
+
+    def seed(self, tenants, orders):
+        User = get_user_model()
+        now = timezone.now()
+        seeded = []
+
+        for number in range(tenants):
+            domain = f"bench-{number}.myshopify.com"
+            user, _ = User.objects.get_or_create(
+                email=f"bench-{number}@example.com",
+                defaults={"username": f"bench-{number}"},
+            )
+            tenant, _ = Tenant.objects.get_or_create(
+                shopify_domain=domain,
+                defaults={"user": user, "name": domain, "access_token": ""},
+            )
+            seeded.append(tenant)
+            base = (number + 1) * 10**9
+
+            customers = Customer.objects.bulk_create(
+                [
+                    Customer(
+                        tenant=tenant,
+                        shopify_customer_id=base + index,
+                        email=f"c{index}@{domain}",
+                        created_at=now,
+                        updated_at=now,
+                    )
+                    for index in range(max(orders // 10, 1))
+                ],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+            customers = list(Customer.objects.filter(tenant=tenant))
+
+            Order.objects.bulk_create(
+                [
+                    Order(
+                        tenant=tenant,
+                        shopify_order_id=base + index,
+                        customer=random.choice(customers),
+                        total_price=Decimal(random.randint(500, 50000)) / 100,
+                        currency="USD",
+                        created_at=now - timedelta(minutes=random.randint(0, 525600)),
+                        updated_at=now,
+                    )
+                    for index in range(orders)
+                ],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+            refresh_customer_aggregates(Customer.objects.filter(tenant=tenant))
+
+            events = CustomEvent.objects.bulk_create(
+                [
+                    CustomEvent(
+                        tenant=tenant,
+                        event_type=random.choice(
+                            ["checkout_started", "checkout_updated"]
+                        ),
+                        cart_value=Decimal(random.randint(500, 50000)) / 100,
+                    )
+                    for _ in range(orders)
+                ],
+                batch_size=5000,
+            )
+            for start in range(0, len(events), 5000):
+                batch = events[start : start + 5000]
+                for event in batch:
+                    event.created_at = now - timedelta(
+                        minutes=random.randint(0, 129600)
+                    )
+                CustomEvent.objects.bulk_update(batch, ["created_at"])
+            today = timezone.localdate()
+            refresh_daily_stats(
+                tenant, [today - timedelta(days=days) for days in range(367)]
+            )
+
+            self.stdout.write(f"Seeded {domain} with {orders} orders and events")
+
+        return seeded[0]
+
+    def measure(self, label, tenant, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {label}"))
+        for name, queryset in dashboard_queries(tenant).items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"{name}: median {statistics.median(timings):.2f} ms, "
+                f"max {max(timings):.2f} ms"
+            )
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f"    {line}")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            with transaction.atomic():
+                tenant = self.seed(options["tenants"], options["seed"])
+        else:
+            domain = options["shop_domain"] or "bench-0.myshopify.com"
+            tenant = Tenant.objects.filter(shopify_domain=domain).first()
+            if tenant is None:
+                raise CommandError(f"Tenant {domain} not found; run with --seed.")
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        # Fresh connections for each run so no statement prepared against the
+        # other index set is reused.
+        connection.close()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for index in DASHBOARD_INDEXES:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index)}")
+            self.measure(
+                "before: without tenant-scoped indexes", tenant, options["repeat"]
+            )
+            transaction.set_rollback(True)
+
+        connection.close()
+        self.measure("after: with tenant-scoped indexes", tenant, options["repeat"])
@@ -0,0 +1,93 @@
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+SAMPLE_ORDER = {
+    "id": 820982911946154500,
+    "total_price": "199.00",
+    "currency": "USD",
+    "financial_status": "paid",
+    "fulfillment_status": None,
+    "created_at": "2024-01-01T00:00:00Z",
+    "updated_at": "2024-01-01T00:00:00Z",
+    "customer": {
+        "id": 115310627314723950,
+        "first_name": "John",
+        "last_name": "Smith",
+        "email": "john@example.com",
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-01-01T00:00:00Z",
+    },
+    "line_items": [{"variant_id": 808950810, "quantity": 1, "price": "199.00"}],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent order webhooks at one or more running deployments and "
+        "compare throughput, e.g. a WSGI server on :8000 against the ASGI one "
+        "on :8001."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="Webhook endpoint URLs to compare")
+        parser.add_argument("--shop-domain", required=True)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=64)
+
+    def run(self, url, shop_domain, total, concurrency):
+        local = threading.local()
+        body = json.dumps(SAMPLE_ORDER)
+
+        def send(_):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            response = local.session.post(
+                url,
+                data=body,
+                headers={
+                    "Content-Type": "application/json",
+                    "X-Shopify-Shop-Domain": shop_domain,
+                    "X-Shopify-Topic": "orders/create",
+                    "X-Shopify-Webhook-Id": str(uuid.uuid4()),
+                },
+                timeout=30,
+            )
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(send, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, code in results if code != 200)
+        quantiles = statistics.quantiles(latencies, n=100)
+        return {
+            "rps": total / elapsed,
+            "p50": quantiles[49] * 1000,
+            "p95": quantiles[94] * 1000,
+            "p99": quantiles[98] * 1000,
+            "errors": errors,
+        }
+
+    def handle(self, *args, **options):
+        for url in options["urls"]:
+            result = self.run(
+                url,
+                options["shop_domain"],
+                options["requests"],
+                options["concurrency"],
+            )
+            self.stdout.write(
+                f"{url}: {result['rps']:.0f} req/s, "
+                f"p50 {result['p50']:.1f} ms, p95 {result['p95']:.1f} ms, "
+                f"p99 {result['p99']:.1f} ms, {result['errors']} errors"
+            )
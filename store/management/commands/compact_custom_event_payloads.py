@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from store.events import event_fields, payload_policy
+from store.models import CustomEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply CUSTOM_EVENT_PAYLOAD_POLICY to custom events that still hold their "
+        "raw payload in metadata, compressing or deleting it. Deleted payloads "
+        "cannot be restored."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        compacted = 0
+        last_id = 0
+
+        while True:
+            events = list(
+                CustomEvent.objects.filter(id__gt=last_id)
+                .exclude(metadata={})
+                .order_by("id")[: options["batch_size"]]
+            )
+            if not events:
+                break
+            last_id = events[-1].id
+
+            events = [
+                event for event in events if payload_policy(event.event_type) != "keep"
+            ]
+            for event in events:
+                for field, value in event_fields(
+                    event.event_type, event.metadata
+                ).items():
+                    setattr(event, field, value)
+            CustomEvent.objects.bulk_update(
+                events,
+                [
+                    "metadata",
+                    "compressed_payload",
+                    "cart_value",
+                    "item_count",
+                    "currency",
+                    "checkout_token",
+                ],
+            )
+            compacted += len(events)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Compacted the payloads of {compacted} events.")
+        )
@@ -0,0 +1,36 @@
+import socket
+import os
+
+from django.core.management.base import BaseCommand
+from store.webhooks import consume_webhooks, duplicate_counts, webhook_metrics
+
+
+class Command(BaseCommand):
+    help = "Apply queued Shopify webhooks from the Redis stream in micro-batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--consumer",
+            default=f"{socket.gethostname()}-{os.getpid()}",
+            help="Consumer name within the group; must be unique per process.",
+        )
+        parser.add_argument(
+            "--count", type=int, help="Batch size, defaults to WEBHOOK_BATCH_SIZE."
+        )
+        parser.add_argument("--block-ms", type=int, default=5000)
+        parser.add_argument(
+            "--stats", action="store_true", help="Print batching metrics and exit."
+        )
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            for key, value in sorted(webhook_metrics().items()):
+                self.stdout.write(f"{key}: {value}")
+            for shopify_domain, count in sorted(duplicate_counts().items()):
+                self.stdout.write(f"duplicates {shopify_domain}: {count}")
+            return
+
+        self.stdout.write(f"Consuming webhooks as {options['consumer']}")
+        consume_webhooks(
+            options["consumer"], block_ms=options["block_ms"], count=options["count"]
+        )
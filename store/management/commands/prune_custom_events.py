@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store.utils import rollup_custom_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll raw custom events older than the retention window up into daily "
+        "per-tenant counts and delete them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.CUSTOM_EVENT_RETENTION_DAYS,
+        )
+
+    def handle(self, *args, **options):
+        pruned = rollup_custom_events(options["retention_days"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rolled up and pruned {pruned} events older than "
+                f"{options['retention_days']} days."
+            )
+        )
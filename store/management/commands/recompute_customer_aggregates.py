@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from store.data_version import bump_data_version
+from store.models import Customer, Tenant
+from store.utils import refresh_customer_aggregates
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute orders_count, total_spent, first_order_at and last_order_at "
+        "from the orders table, for one tenant or all of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("shopify_domain", nargs="?")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.all()
+        if options["shopify_domain"]:
+            tenants = tenants.filter(shopify_domain=options["shopify_domain"])
+            if not tenants.exists():
+                raise CommandError(f"Tenant {options['shopify_domain']} not found.")
+
+        for tenant in tenants:
+            updated = 0
+            last_id = 0
+            while True:
+                ids = list(
+                    Customer.objects.filter(tenant=tenant, id__gt=last_id)
+                    .order_by("id")
+                    .values_list("id", flat=True)[: options["batch_size"]]
+                )
+                if not ids:
+                    break
+                last_id = ids[-1]
+                updated += refresh_customer_aggregates(
+                    Customer.objects.filter(id__in=ids)
+                )
+            bump_data_version(tenant.id)
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Recomputed aggregates for {updated} customers of "
+                    f"{tenant.shopify_domain}"
+                )
+            )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from store.models import Tenant
+from store.sync_lock import is_sync_running
+from store.tasks import fetch_existing_data_task
+from store.utils import cancel_sync
+
+
+class Command(BaseCommand):
+    help = "Queue a Shopify backfill for a tenant, optionally ignoring sync cursors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("shopify_domain")
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Refetch everything instead of only what changed since the last sync.",
+        )
+        parser.add_argument(
+            "--cancel",
+            action="store_true",
+            help="Pause running syncs after their current page instead of queueing one.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(shopify_domain=options["shopify_domain"])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"Tenant {options['shopify_domain']} not found.")
+
+        if options["cancel"]:
+            cancelled = cancel_sync(tenant)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Cancelled {cancelled} running syncs for {tenant.shopify_domain}"
+                )
+            )
+            return
+
+        # The task drops duplicates itself; checking first lets us say so
+        # instead of reporting a sync that will never run.
+        if is_sync_running(tenant.id):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Sync already running for {tenant.shopify_domain}, not queued. "
+                    "Use --cancel to pause it first."
+                )
+            )
+            return
+
+        fetch_existing_data_task.delay(tenant.id, full_resync=options["full"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Queued {'full' if options['full'] else 'incremental'} sync "
+                f"for {tenant.shopify_domain}"
+            )
+        )
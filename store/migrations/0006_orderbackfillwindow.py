@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_synccursor"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderBackfillWindow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at_min", models.DateTimeField(blank=True, null=True)),
+                ("created_at_max", models.DateTimeField(blank=True, null=True)),
+                ("expected_count", models.IntegerField(default=0)),
+                ("fetched_count", models.IntegerField(default=0)),
+                ("last_updated_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_backfill_windows",
+                        to="store.tenant",
+                    ),
+                ),
+            ],
+        ),
+    ]
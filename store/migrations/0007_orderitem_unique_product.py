@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:19
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_order_items(apps, schema_editor):
+    OrderItem = apps.get_model("store", "OrderItem")
+    keep = (
+        OrderItem.objects.filter(product__isnull=False)
+        .values("order_id", "product_id")
+        .annotate(keep_id=Max("id"))
+        .values_list("keep_id", flat=True)
+    )
+    OrderItem.objects.filter(product__isnull=False).exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0006_orderbackfillwindow"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_order_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="orderitem",
+            constraint=models.UniqueConstraint(
+                fields=("order", "product"), name="unique_order_item_product"
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0008_pendingorderitem"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderbackfillwindow",
+            name="next_url",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="synccursor",
+            name="next_url",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="synccursor",
+            name="run_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="synccursor",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("idle", "Idle"),
+                    ("running", "Running"),
+                    ("cancelled", "Cancelled"),
+                    ("failed", "Failed"),
+                ],
+                default="idle",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="synccursor",
+            name="synced_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="orderbackfillwindow",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("cancelled", "Cancelled"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:22
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    WebhookSubscription = apps.get_model("store", "WebhookSubscription")
+    keep = (
+        WebhookSubscription.objects.values("tenant_id", "topic")
+        .annotate(keep_id=Max("id"))
+        .values_list("keep_id", flat=True)
+    )
+    WebhookSubscription.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_sync_checkpoints"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="webhooksubscription",
+            constraint=models.UniqueConstraint(
+                fields=("tenant", "topic"), name="unique_webhook_subscription"
+            ),
+        ),
+    ]
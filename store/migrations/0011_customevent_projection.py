@@ -0,0 +1,95 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:32
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+def as_decimal(value):
+    try:
+        return Decimal(str(value)) if value is not None else None
+    except InvalidOperation:
+        return None
+
+
+def project_existing_events(apps, schema_editor):
+    # Only fills the new columns; the raw payloads stay in metadata until
+    # compact_custom_event_payloads applies the payload policy to them.
+    CustomEvent = apps.get_model("store", "CustomEvent")
+    last_id = 0
+
+    while True:
+        events = list(
+            CustomEvent.objects.filter(id__gt=last_id)
+            .exclude(metadata={})
+            .order_by("id")[:1000]
+        )
+        if not events:
+            break
+        last_id = events[-1].id
+
+        for event in events:
+            data = event.metadata
+            line_items = data.get("line_items")
+            event.cart_value = as_decimal(data.get("total_price"))
+            event.item_count = (
+                sum(item.get("quantity") or 0 for item in line_items)
+                if line_items is not None
+                else None
+            )
+            event.currency = data.get("currency") or data.get("presentment_currency")
+            event.checkout_token = data.get("token")
+        CustomEvent.objects.bulk_update(
+            events, ["cart_value", "item_count", "currency", "checkout_token"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_webhooksubscription_unique_topic"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customevent",
+            name="cart_value",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="customevent",
+            name="checkout_token",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="customevent",
+            name="compressed_payload",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="customevent",
+            name="currency",
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name="customevent",
+            name="item_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="customevent",
+            index=models.Index(
+                fields=["tenant", "checkout_token"], name="store_event_checkout_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customevent",
+            index=models.Index(
+                fields=["tenant", "currency", "cart_value"],
+                name="store_event_cart_value_idx",
+            ),
+        ),
+        migrations.RunPython(project_existing_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Events are appended in created_at order, so on PostgreSQL a BRIN index lets
+# recent-window scans skip every block range outside the window for a tiny
+# fraction of a B-tree's size. Other backends rely on retention alone.
+
+
+def create_created_at_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS store_event_created_brin "
+            "ON store_customevent USING brin (created_at)"
+        )
+
+
+def drop_created_at_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS store_event_created_brin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_customevent_projection"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CustomEventDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("event_type", models.CharField(max_length=100)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "cart_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="event_rollups",
+                        to="store.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant", "date", "event_type"),
+                        name="unique_custom_event_rollup",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_created_at_brin, drop_created_at_brin),
+    ]
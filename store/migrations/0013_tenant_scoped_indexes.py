@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0012_customevent_retention"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="customer",
+            name="shopify_customer_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="shopify_order_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="shopify_product_id",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name="customevent",
+            index=models.Index(
+                fields=["tenant", "event_type", "created_at"],
+                name="store_event_type_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["tenant", "created_at"], name="store_order_tenant_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["tenant", "customer", "total_price"],
+                name="store_order_tenant_cust_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="customer",
+            constraint=models.UniqueConstraint(
+                fields=("tenant", "shopify_customer_id"),
+                name="unique_tenant_shopify_customer",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="order",
+            constraint=models.UniqueConstraint(
+                fields=("tenant", "shopify_order_id"),
+                name="unique_tenant_shopify_order",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.UniqueConstraint(
+                fields=("tenant", "shopify_product_id"),
+                name="unique_tenant_shopify_product",
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:37
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def compute_customer_aggregates(apps, schema_editor):
+    Customer = apps.get_model("store", "Customer")
+    Order = apps.get_model("store", "Order")
+    orders = Order.objects.filter(customer=OuterRef("pk")).order_by().values("customer")
+
+    def aggregate(expression):
+        return Subquery(orders.annotate(value=expression).values("value"))
+
+    Customer.objects.update(
+        orders_count=Coalesce(aggregate(Count("id")), 0),
+        total_spent=Coalesce(
+            aggregate(Sum("total_price")),
+            Value(0),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+        first_order_at=aggregate(Min("created_at")),
+        last_order_at=aggregate(Max("created_at")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0013_tenant_scoped_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="first_order_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="last_order_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="orders_count",
+            field=models.IntegerField(db_default=0, default=0),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="total_spent",
+            field=models.DecimalField(
+                db_default=0, decimal_places=2, default=0, max_digits=14
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["tenant", "-total_spent"], name="store_customer_top_spent_idx"
+            ),
+        ),
+        migrations.RunPython(compute_customer_aggregates, migrations.RunPython.noop),
+    ]
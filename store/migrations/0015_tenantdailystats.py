@@ -0,0 +1,109 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    Tenant = apps.get_model("store", "Tenant")
+    Order = apps.get_model("store", "Order")
+    Customer = apps.get_model("store", "Customer")
+    CustomEvent = apps.get_model("store", "CustomEvent")
+    CustomEventDailyRollup = apps.get_model("store", "CustomEventDailyRollup")
+    TenantDailyStats = apps.get_model("store", "TenantDailyStats")
+
+    def per_day(queryset, *fields, **aggregates):
+        return (
+            queryset.annotate(date=TruncDate("created_at"))
+            .values("date", *fields)
+            .annotate(**aggregates)
+        )
+
+    for tenant_id in Tenant.objects.values_list("id", flat=True):
+        stats = {}
+
+        def day(date):
+            return stats.setdefault(
+                date,
+                TenantDailyStats(
+                    tenant_id=tenant_id, date=date, revenue=0, revenue_by_currency={}
+                ),
+            )
+
+        orders = Order.objects.filter(tenant_id=tenant_id)
+        for row in per_day(
+            orders, "currency", count=Count("id"), revenue=Sum("total_price")
+        ):
+            entry = day(row["date"])
+            entry.orders_count += row["count"]
+            entry.revenue += row["revenue"] or 0
+            entry.revenue_by_currency[row["currency"]] = f"{row['revenue'] or 0:.2f}"
+
+        customers = Customer.objects.filter(tenant_id=tenant_id)
+        for row in per_day(customers, count=Count("id")):
+            day(row["date"]).new_customers = row["count"]
+
+        events = CustomEvent.objects.filter(tenant_id=tenant_id)
+        for row in per_day(events, count=Count("id")):
+            day(row["date"]).checkout_events += row["count"]
+        rollups = (
+            CustomEventDailyRollup.objects.filter(tenant_id=tenant_id)
+            .values("date")
+            .annotate(count=Sum("count"))
+        )
+        for row in rollups:
+            day(row["date"]).checkout_events += row["count"]
+
+        TenantDailyStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0014_customer_order_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TenantDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("orders_count", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("revenue_by_currency", models.JSONField(default=dict)),
+                ("new_customers", models.IntegerField(default=0)),
+                ("checkout_events", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="store.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant", "date"), name="unique_tenant_daily_stats"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
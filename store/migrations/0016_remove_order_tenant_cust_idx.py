@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0015_tenantdailystats"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="order",
+            name="store_order_tenant_cust_idx",
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from .events import decompress_payload
 
 
 class Tenant(models.Model):
@@ -17,7 +18,7 @@ class Customer(models.Model):
     tenant = models.ForeignKey(
         Tenant, on_delete=models.CASCADE, related_name="customers"
     )
-    shopify_customer_id = models.BigIntegerField(unique=True)
+    shopify_customer_id = models.BigIntegerField()
     first_name = models.CharField(max_length=100, blank=True, null=True)
     last_name = models.CharField(max_length=100, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
@@ -31,6 +32,27 @@ class Customer(models.Model):
     company = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
+    # Lifetime aggregates over the customer's orders, refreshed whenever
+    # their orders are written.
+    orders_count = models.IntegerField(default=0, db_default=0)
+    total_spent = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, db_default=0
+    )
+    first_order_at = models.DateTimeField(null=True, blank=True)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "shopify_customer_id"],
+                name="unique_tenant_shopify_customer",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["tenant", "-total_spent"], name="store_customer_top_spent_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
@@ -40,7 +62,7 @@ class Product(models.Model):
     tenant = models.ForeignKey(
         Tenant, on_delete=models.CASCADE, related_name="products"
     )
-    shopify_product_id = models.BigIntegerField(unique=True)
+    shopify_product_id = models.BigIntegerField()
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -49,13 +71,21 @@ class Product(models.Model):
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "shopify_product_id"],
+                name="unique_tenant_shopify_product",
+            )
+        ]
+
     def __str__(self):
         return self.title
 
 
 class Order(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="orders")
-    shopify_order_id = models.BigIntegerField(unique=True)
+    shopify_order_id = models.BigIntegerField()
     customer = models.ForeignKey(
         Customer,
         on_delete=models.SET_NULL,
@@ -70,6 +100,20 @@ class Order(models.Model):
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "shopify_order_id"],
+                name="unique_tenant_shopify_order",
+            )
+        ]
+        indexes = [
+            # Date-range dashboards within a tenant.
+            models.Index(
+                fields=["tenant", "created_at"], name="store_order_tenant_created_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"Order {self.shopify_order_id} - {self.total_price} {self.currency}"
 
@@ -82,10 +126,40 @@ class OrderItem(models.Model):
     quantity = models.IntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "product"], name="unique_order_item_product"
+            )
+        ]
+
     def __str__(self):
         return f"{self.quantity}x {self.product} in Order {self.order.id}"
 
 
+class PendingOrderItem(models.Model):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.CASCADE, related_name="pending_order_items"
+    )
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="pending_items"
+    )
+    variant_id = models.BigIntegerField()
+    quantity = models.IntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "variant_id"], name="unique_pending_order_item"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x variant {self.variant_id} pending for Order {self.order_id}"
+
+
 class CustomEvent(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="events")
     event_type = models.CharField(max_length=100)
@@ -93,11 +167,40 @@ class CustomEvent(models.Model):
         Customer, on_delete=models.SET_NULL, null=True, blank=True
     )
     metadata = models.JSONField(default=dict)
+    compressed_payload = models.BinaryField(null=True, blank=True)
+    cart_value = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    item_count = models.PositiveIntegerField(null=True, blank=True)
+    currency = models.CharField(max_length=10, null=True, blank=True)
+    checkout_token = models.CharField(max_length=255, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["tenant", "checkout_token"], name="store_event_checkout_idx"
+            ),
+            models.Index(
+                fields=["tenant", "currency", "cart_value"],
+                name="store_event_cart_value_idx",
+            ),
+            models.Index(
+                fields=["tenant", "event_type", "created_at"],
+                name="store_event_type_created_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.event_type} - {self.tenant.name}"
 
+    @property
+    def payload(self):
+        """The full Shopify payload, wherever its storage policy put it."""
+        if self.compressed_payload is not None:
+            return decompress_payload(self.compressed_payload)
+        return self.metadata
+
 
 class WebhookSubscription(models.Model):
     tenant = models.ForeignKey(
@@ -109,5 +212,125 @@ class WebhookSubscription(models.Model):
     last_response = models.JSONField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "topic"], name="unique_webhook_subscription"
+            )
+        ]
+
     def __str__(self):
         return f"{self.tenant.shopify_domain} -> {self.topic} ({self.status})"
+
+
+class SyncCursor(models.Model):
+    RESOURCE_CHOICES = [
+        ("products", "Products"),
+        ("customers", "Customers"),
+        ("orders", "Orders"),
+    ]
+    STATUS_CHOICES = [
+        ("idle", "Idle"),
+        ("running", "Running"),
+        ("cancelled", "Cancelled"),
+        ("failed", "Failed"),
+    ]
+
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.CASCADE, related_name="sync_cursors"
+    )
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES)
+    last_updated_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="idle")
+    next_url = models.TextField(blank=True, null=True)
+    # Start of the current run, minus clock skew; becomes last_updated_at
+    # when the run completes.
+    run_updated_at = models.DateTimeField(null=True, blank=True)
+    synced_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "resource"], name="unique_sync_cursor"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.tenant.shopify_domain} {self.resource} @ {self.last_updated_at}"
+
+
+class OrderBackfillWindow(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("cancelled", "Cancelled"),
+        ("failed", "Failed"),
+    ]
+
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.CASCADE, related_name="order_backfill_windows"
+    )
+    created_at_min = models.DateTimeField(null=True, blank=True)
+    created_at_max = models.DateTimeField(null=True, blank=True)
+    expected_count = models.IntegerField(default=0)
+    fetched_count = models.IntegerField(default=0)
+    # When the window's walk started, minus clock skew.
+    last_updated_at = models.DateTimeField(null=True, blank=True)
+    next_url = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return (
+            f"{self.tenant.shopify_domain} orders {self.created_at_min} -> "
+            f"{self.created_at_max} ({self.status})"
+        )
+
+
+class CustomEventDailyRollup(models.Model):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.CASCADE, related_name="event_rollups"
+    )
+    date = models.DateField()
+    event_type = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+    cart_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "date", "event_type"],
+                name="unique_custom_event_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.tenant.shopify_domain} {self.date} {self.event_type}: {self.count}"
+        )
+
+
+class TenantDailyStats(models.Model):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    date = models.DateField()
+    orders_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue_by_currency = models.JSONField(default=dict)
+    new_customers = models.IntegerField(default=0)
+    checkout_events = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "date"], name="unique_tenant_daily_stats"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.tenant.shopify_domain} {self.date}: {self.orders_count} orders"
@@ -0,0 +1,136 @@
+import threading
+import time
+
+from django.conf import settings
+
+# Buckets are tracked as the time at which they will have fully drained
+# (GCRA), so a single value per shop is enough and every worker that sees
+# the same Redis key shares the same budget.
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call("GET", KEYS[1]) or now), now)
+local wait = tat + interval - now - burst
+if wait > 0 then
+    return tostring(wait)
+end
+redis.call("SET", KEYS[1], tostring(tat + interval), "EX", math.ceil(burst) + 60)
+return "0"
+"""
+
+RAISE_SCRIPT = """
+local tat = tonumber(redis.call("GET", KEYS[1]) or 0)
+local value = tonumber(ARGV[1])
+if value > tat then
+    redis.call("SET", KEYS[1], tostring(value), "EX", math.ceil(tonumber(ARGV[2])) + 60)
+end
+return "OK"
+"""
+
+
+def get_redis():
+    try:
+        from django_redis import get_redis_connection
+
+        return get_redis_connection("default")
+    except (ImportError, NotImplementedError):
+        return None
+
+
+class LocalBucketStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tats = {}
+
+    def reserve(self, key, now, interval, burst):
+        with self.lock:
+            tat = max(self.tats.get(key, now), now)
+            wait = tat + interval - now - burst
+            if wait > 0:
+                return wait
+            self.tats[key] = tat + interval
+            return 0
+
+    def raise_to(self, key, value, burst):
+        with self.lock:
+            self.tats[key] = max(self.tats.get(key, 0), value)
+
+
+class RedisBucketStore:
+    def __init__(self, redis):
+        self.reserve_script = redis.register_script(RESERVE_SCRIPT)
+        self.raise_script = redis.register_script(RAISE_SCRIPT)
+
+    def reserve(self, key, now, interval, burst):
+        return float(self.reserve_script(keys=[key], args=[now, interval, burst]))
+
+    def raise_to(self, key, value, burst):
+        self.raise_script(keys=[key], args=[value, burst])
+
+
+local_store = LocalBucketStore()
+
+
+class ShopifyRateLimiter:
+    """Leaky bucket shared by every worker calling the same shop.
+
+    ``clock`` and ``sleep`` can be swapped for fakes, and ``store`` for a
+    ``LocalBucketStore``, to exercise the limiter without Redis or real time.
+    """
+
+    def __init__(
+        self,
+        shop_domain,
+        capacity=None,
+        leak_rate=None,
+        clock=time.time,
+        sleep=time.sleep,
+        store=None,
+    ):
+        self.key = f"shopify-bucket:{shop_domain}"
+        self.capacity = capacity or settings.SHOPIFY_BUCKET_SIZE
+        self.leak_rate = leak_rate or settings.SHOPIFY_LEAK_RATE
+        self.clock = clock
+        self.sleep = sleep
+
+        if store is None:
+            redis = get_redis()
+            store = RedisBucketStore(redis) if redis is not None else local_store
+        self.store = store
+
+    @property
+    def burst(self):
+        return self.capacity / self.leak_rate
+
+    def acquire(self):
+        while True:
+            wait = self.store.reserve(
+                self.key, self.clock(), 1 / self.leak_rate, self.burst
+            )
+            if wait <= 0:
+                return
+            self.sleep(wait)
+
+    def update_from_headers(self, headers):
+        call_limit = headers.get("X-Shopify-Shop-Api-Call-Limit")
+        if call_limit:
+            try:
+                used, capacity = (int(part) for part in call_limit.split("/"))
+            except ValueError:
+                used, capacity = None, None
+            if used is not None:
+                self.capacity = capacity
+                self.store.raise_to(
+                    self.key, self.clock() + used / self.leak_rate, self.burst
+                )
+
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            try:
+                self.back_off(float(retry_after))
+            except ValueError:
+                pass
+
+    def back_off(self, seconds):
+        self.store.raise_to(self.key, self.clock() + seconds + self.burst, self.burst)
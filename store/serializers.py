@@ -8,6 +8,8 @@ from .models import (
     CustomEvent,
     WebhookSubscription,
 )
+from .sync_lock import is_sync_running
+from .utils import order_backfill_progress
 
 
 class TenantSerializer(serializers.ModelSerializer):
@@ -17,6 +19,22 @@ class TenantSerializer(serializers.ModelSerializer):
         extra_kwargs = {"access_token": {"write_only": True}}
 
 
+class TenantDetailSerializer(TenantSerializer):
+    # Sync status costs a Redis lookup and a window query per tenant, so it
+    # is only reported for a single tenant, not on the list endpoint.
+    sync_running = serializers.SerializerMethodField()
+    order_backfill = serializers.SerializerMethodField()
+
+    class Meta(TenantSerializer.Meta):
+        fields = TenantSerializer.Meta.fields + ["sync_running", "order_backfill"]
+
+    def get_sync_running(self, obj):
+        return is_sync_running(obj.id)
+
+    def get_order_backfill(self, obj):
+        return order_backfill_progress(obj)
+
+
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
@@ -113,9 +131,22 @@ class OrderWriteSerializer(serializers.ModelSerializer):
 
 
 class CustomEventSerializer(serializers.ModelSerializer):
+    metadata = serializers.JSONField(source="payload", read_only=True)
+
     class Meta:
         model = CustomEvent
-        fields = ["id", "tenant", "event_type", "customer", "metadata", "created_at"]
+        fields = [
+            "id",
+            "tenant",
+            "event_type",
+            "customer",
+            "cart_value",
+            "item_count",
+            "currency",
+            "checkout_token",
+            "metadata",
+            "created_at",
+        ]
 
 
 class WebhookSubscriptionSerializer(serializers.ModelSerializer):
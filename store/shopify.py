@@ -0,0 +1,144 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .ratelimit import ShopifyRateLimiter
+
+# Least recently used shops first; evicted sessions are closed so a worker
+# serving many tenants keeps at most SHOPIFY_SESSION_CACHE_SIZE pools open.
+sessions = OrderedDict()
+sessions_lock = threading.Lock()
+
+
+class ShopifyAPIError(requests.exceptions.RequestException):
+    pass
+
+
+def get_session(shop_domain):
+    with sessions_lock:
+        session = sessions.get(shop_domain)
+        if session is not None:
+            sessions.move_to_end(shop_domain)
+        else:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=settings.SHOPIFY_POOL_SIZE,
+                max_retries=Retry(
+                    total=settings.SHOPIFY_CONNECT_RETRIES,
+                    connect=settings.SHOPIFY_CONNECT_RETRIES,
+                    read=0,
+                    status=0,
+                    backoff_factor=0.5,
+                ),
+            )
+            session.mount("https://", adapter)
+            session.headers.update(
+                {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+            )
+            sessions[shop_domain] = session
+            while len(sessions) > settings.SHOPIFY_SESSION_CACHE_SIZE:
+                _, evicted = sessions.popitem(last=False)
+                evicted.close()
+        return session
+
+
+def next_link(headers):
+    link_header = headers.get("Link")
+    if link_header:
+        links = link_header.split(", ")
+        for link in links:
+            if 'rel="next"' in link:
+                return link.split(";")[0].strip("<>")
+    return None
+
+
+class ShopifyClient:
+    """Admin API client for one shop, sharing a keep-alive pool per domain.
+
+    Calls made with an access token go through the shop's rate limiter and
+    are retried on 429 and 5xx responses; unauthenticated calls (the OAuth
+    token exchange) are sent once.
+    """
+
+    def __init__(self, shop_domain, access_token=None, api_version=None):
+        self.shop_domain = shop_domain
+        self.access_token = access_token
+        self.api_version = api_version or settings.SHOPIFY_API_VERSION
+        self.session = get_session(shop_domain)
+        self.limiter = ShopifyRateLimiter(shop_domain) if access_token else None
+
+    def url(self, path):
+        if path.startswith("https://"):
+            return path
+        if path.startswith("/"):
+            return f"https://{self.shop_domain}{path}"
+        return f"https://{self.shop_domain}/admin/api/{self.api_version}/{path}"
+
+    def request(self, method, path, **kwargs):
+        url = self.url(path)
+        kwargs.setdefault("timeout", settings.SHOPIFY_TIMEOUT)
+        headers = kwargs.pop("headers", {})
+        if self.access_token:
+            headers["X-Shopify-Access-Token"] = self.access_token
+
+        for attempt in range(settings.SHOPIFY_MAX_RETRIES + 1):
+            if not self.limiter:
+                return self.session.request(method, url, headers=headers, **kwargs)
+
+            self.limiter.acquire()
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            self.limiter.update_from_headers(response.headers)
+
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+
+            if not response.headers.get("Retry-After"):
+                self.limiter.back_off(2**attempt)
+            logging.warning(
+                f"Shopify returned {response.status_code} for {url}, "
+                f"retrying (attempt {attempt + 1})"
+            )
+
+        raise ShopifyAPIError(
+            f"Giving up on {url} after {response.status_code} responses",
+            response=response,
+        )
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def paginate(self, path, key, params=None, start_url=None):
+        """Yield ``(records, next_url)`` for every page of a list endpoint.
+
+        ``start_url`` resumes from a ``next_url`` saved by an earlier run.
+        """
+        url = self.url(path)
+        if start_url:
+            url, params = start_url, None
+
+        while url:
+            response = self.get(url, params=params)
+            if response.status_code != 200:
+                raise ShopifyAPIError(
+                    f"{response.status_code} from {url}: {response.text}",
+                    response=response,
+                )
+
+            url = next_link(response.headers)
+            params = None
+            yield response.json().get(key, []), url
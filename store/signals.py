@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .data_version import bump_data_version
+from .models import Customer, CustomEvent, Order, Product, Tenant
+from .tenant_cache import invalidate_tenant
+
+# Invalidation waits for the commit so a concurrent request cannot re-cache
+# the row as it was before the write.
+
+
+@receiver(pre_save, sender=Tenant)
+def invalidate_previous_tenant_keys(sender, instance, **kwargs):
+    # The domain or user may be changing, so drop the keys of the stored row.
+    if instance.pk is None:
+        return
+    previous = (
+        Tenant.objects.filter(pk=instance.pk)
+        .values_list("shopify_domain", "user_id")
+        .first()
+    )
+    if previous:
+        transaction.on_commit(lambda: invalidate_tenant(*previous))
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant_keys(sender, instance, **kwargs):
+    shopify_domain, user_id = instance.shopify_domain, instance.user_id
+    transaction.on_commit(lambda: invalidate_tenant(shopify_domain, user_id))
+
+
+# Bulk upserts in the savers bump the version themselves; this covers rows
+# saved one at a time through the detail views. Deletes bump explicitly in
+# the views, since a post_delete receiver would turn queryset deletes such
+# as the custom event pruning into row-by-row deletes.
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=CustomEvent)
+def bump_tenant_data_version(sender, instance, **kwargs):
+    bump_data_version(instance.tenant_id)
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .ratelimit import get_redis
+
+# Deletes the lock only while it still belongs to the caller, so a task whose
+# lock expired and was taken over never releases the new holder's lock.
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def sync_lock_key(tenant_id, job):
+    return f"sync-lock:{job}:{tenant_id}"
+
+
+def acquire_sync_lock(tenant_id, job, owner, timeout):
+    key = sync_lock_key(tenant_id, job)
+    redis = get_redis()
+    if redis is None:
+        return cache.add(key, owner, timeout=timeout)
+    return bool(redis.set(key, owner, nx=True, ex=timeout))
+
+
+def refresh_sync_lock(tenant_id, job, timeout=None):
+    """Push back the expiry of a held lock; called as a sync checkpoints pages."""
+    key = sync_lock_key(tenant_id, job)
+    timeout = timeout or settings.SYNC_LOCK_TIMEOUT
+    redis = get_redis()
+    if redis is None:
+        return cache.touch(key, timeout)
+    return bool(redis.expire(key, timeout))
+
+
+def release_sync_lock(tenant_id, job, owner=None):
+    key = sync_lock_key(tenant_id, job)
+    redis = get_redis()
+    if redis is None:
+        if owner is None or cache.get(key) == owner:
+            cache.delete(key)
+    elif owner is None:
+        redis.delete(key)
+    else:
+        redis.register_script(RELEASE_SCRIPT)(keys=[key], args=[owner])
+
+
+def is_sync_running(tenant_id, job="backfill"):
+    key = sync_lock_key(tenant_id, job)
+    redis = get_redis()
+    if redis is None:
+        return cache.get(key) is not None
+    return bool(redis.exists(key))
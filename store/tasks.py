@@ -1,20 +1,159 @@
-from celery import shared_task
-from .utils import fetch_existing_data, subscribe_to_webhooks
+from celery import chain, chord, group, shared_task
+from django.conf import settings
+import logging
+from .utils import (
+    create_order_windows,
+    fetch_order_window,
+    link_pending_order_items,
+    merge_order_windows,
+    prune_pending_order_items,
+    rollup_custom_events,
+    subscribe_to_webhooks,
+    sync_resource,
+)
+from .sync_lock import acquire_sync_lock, release_sync_lock
+
+
+@shared_task(bind=True)
+def fetch_existing_data_task(self, tenant_id, full_resync=False):
+    # Only one backfill per tenant at a time; repeated logins or reinstalls
+    # while one is running are dropped rather than queued behind it.
+    if not acquire_sync_lock(
+        tenant_id, "backfill", self.request.id, settings.SYNC_LOCK_TIMEOUT
+    ):
+        logging.info(f"Sync already running for tenant {tenant_id}, skipping")
+        return False
+
+    # Customers are independent of products, so they run on their own
+    # branch; orders wait for products so line items can be linked.
+    chord(
+        group(
+            sync_resource_task.si(tenant_id, "customers", full_resync),
+            chain(
+                sync_resource_task.si(tenant_id, "products", full_resync),
+                sync_orders_task.si(tenant_id, full_resync),
+            ),
+        ),
+        release_sync_lock_task.si(tenant_id, "backfill", self.request.id),
+    ).on_error(
+        release_sync_lock_task.si(tenant_id, "backfill", self.request.id)
+    ).apply_async()
+    return True
+
+
+@shared_task
+def release_sync_lock_task(tenant_id, job, owner=None):
+    release_sync_lock(tenant_id, job, owner)
+
+
+@shared_task
+def sync_resource_task(tenant_id, resource, full_resync=False):
+    from .models import Tenant
+
+    try:
+        tenant = Tenant.objects.get(id=tenant_id)
+        sync_resource(tenant, resource, full_resync=full_resync)
+        if resource == "products":
+            link_pending_order_items(tenant)
+    except Tenant.DoesNotExist:
+        pass
+
+
+@shared_task(bind=True)
+def sync_orders_task(self, tenant_id, full_resync=False):
+    from .models import OrderBackfillWindow, SyncCursor, Tenant
+
+    try:
+        tenant = Tenant.objects.get(id=tenant_id)
+    except Tenant.DoesNotExist:
+        return
+
+    cursor, _ = SyncCursor.objects.get_or_create(tenant=tenant, resource="orders")
+    unfinished = []
+    if not full_resync:
+        unfinished = list(
+            OrderBackfillWindow.objects.filter(tenant=tenant).exclude(status="done")
+        )
+    if cursor.last_updated_at and not full_resync and not unfinished:
+        sync_resource(tenant, "orders")
+        return
+
+    # Full order backfills are split into created_at windows that run as
+    # separate tasks and are merged once they have all finished. Windows
+    # left unfinished by an interrupted run are resumed instead of replanned.
+    windows = unfinished or create_order_windows(tenant)
+    SyncCursor.objects.filter(id=cursor.id).update(status="running")
+
+    if len(windows) == 1:
+        fetch_order_window(windows[0])
+        merge_order_windows(tenant)
+        return
+
+    return self.replace(
+        chord(
+            group(fetch_order_window_task.si(window.id) for window in windows),
+            merge_order_windows_task.si(tenant_id),
+        )
+    )
+
+
+@shared_task
+def fetch_order_window_task(window_id):
+    from .models import OrderBackfillWindow
+
+    try:
+        window = OrderBackfillWindow.objects.select_related("tenant").get(id=window_id)
+        fetch_order_window(window)
+    except OrderBackfillWindow.DoesNotExist:
+        pass
+
 
 @shared_task
-def fetch_existing_data_task(tenant_id):
+def merge_order_windows_task(tenant_id):
     from .models import Tenant
+
     try:
         tenant = Tenant.objects.get(id=tenant_id)
-        fetch_existing_data(tenant)
+        merge_order_windows(tenant)
     except Tenant.DoesNotExist:
         pass
 
+
 @shared_task
-def subscribe_to_webhooks_task(tenant_id):
+def link_pending_order_items_task(tenant_id, variant_ids=None):
     from .models import Tenant
+
+    try:
+        tenant = Tenant.objects.get(id=tenant_id)
+        link_pending_order_items(tenant, variant_ids)
+    except Tenant.DoesNotExist:
+        pass
+
+
+@shared_task(bind=True)
+def subscribe_to_webhooks_task(self, tenant_id):
+    from .models import Tenant
+
+    if not acquire_sync_lock(
+        tenant_id, "webhooks", self.request.id, settings.SYNC_LOCK_TIMEOUT
+    ):
+        logging.info(f"Webhook setup already running for tenant {tenant_id}, skipping")
+        return
+
     try:
         tenant = Tenant.objects.get(id=tenant_id)
         subscribe_to_webhooks(tenant)
     except Tenant.DoesNotExist:
         pass
+    finally:
+        release_sync_lock(tenant_id, "webhooks", self.request.id)
+
+
+@shared_task
+def rollup_custom_events_task():
+    rollup_custom_events()
+
+
+@shared_task
+def prune_pending_order_items_task():
+    prune_pending_order_items()
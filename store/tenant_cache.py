@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Tenant
+
+
+class LocalTenantCache:
+    """Small in-process LRU whose entries expire after ``ttl`` seconds.
+
+    Signals only clear Redis and the local cache of the process that saved the
+    tenant, so the TTL bounds how long other processes can serve a stale entry.
+    """
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalTenantCache(
+    settings.TENANT_CACHE_LOCAL_SIZE, settings.TENANT_CACHE_LOCAL_TTL
+)
+
+
+def domain_key(shopify_domain):
+    return f"tenant:domain:{shopify_domain}"
+
+
+def user_key(user_id):
+    return f"tenant:user:{user_id}"
+
+
+def cached_tenant(key, lookup):
+    tenant = local_cache.get(key)
+    if tenant is not None:
+        return tenant
+
+    tenant = cache.get(key)
+    if tenant is None:
+        tenant = Tenant.objects.filter(**lookup).first()
+        if tenant is None:
+            return None
+        cache.set(key, tenant, timeout=settings.TENANT_CACHE_TTL)
+
+    local_cache.set(key, tenant)
+    return tenant
+
+
+async def acached_tenant(key, lookup):
+    tenant = local_cache.get(key)
+    if tenant is not None:
+        return tenant
+
+    tenant = await cache.aget(key)
+    if tenant is None:
+        tenant = await Tenant.objects.filter(**lookup).afirst()
+        if tenant is None:
+            return None
+        await cache.aset(key, tenant, timeout=settings.TENANT_CACHE_TTL)
+
+    local_cache.set(key, tenant)
+    return tenant
+
+
+def get_tenant_for_domain(shopify_domain):
+    if not shopify_domain:
+        return None
+    return cached_tenant(domain_key(shopify_domain), {"shopify_domain": shopify_domain})
+
+
+async def aget_tenant_for_domain(shopify_domain):
+    if not shopify_domain:
+        return None
+    return await acached_tenant(
+        domain_key(shopify_domain), {"shopify_domain": shopify_domain}
+    )
+
+
+def get_tenant_for_user(user):
+    if not user or not user.is_authenticated:
+        return None
+    return cached_tenant(user_key(user.pk), {"user_id": user.pk})
+
+
+def invalidate_tenant(shopify_domain=None, user_id=None):
+    keys = []
+    if shopify_domain:
+        keys.append(domain_key(shopify_domain))
+    if user_id:
+        keys.append(user_key(user_id))
+
+    for key in keys:
+        local_cache.delete(key)
+    cache.delete_many(keys)
@@ -1,3 +1,813 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import requests
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import (
+    CustomEvent,
+    CustomEventDailyRollup,
+    Customer,
+    Order,
+    OrderItem,
+    PendingOrderItem,
+    SyncCursor,
+    Tenant,
+    TenantDailyStats,
+)
+from .ratelimit import LocalBucketStore, ShopifyRateLimiter
+from .shopify import get_session, sessions
+from .sync_lock import (
+    acquire_sync_lock,
+    is_sync_running,
+    refresh_sync_lock,
+    release_sync_lock,
+)
+from .utils import (
+    prune_pending_order_items,
+    rollup_custom_events,
+    save_customers_page,
+    save_orders_page,
+    save_products_page,
+    sync_resource,
+)
+from .webhooks import (
+    GROUP,
+    apply_orders,
+    apply_products,
+    coalesce,
+    process_messages,
+    save_embedded_customers,
+)
+
+TIMESTAMP = "2025-01-15T10:00:00Z"
+
+
+class SaveOrdersPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+        save_products_page(
+            cls.tenant,
+            [
+                {
+                    "id": 1,
+                    "title": "Product",
+                    "created_at": TIMESTAMP,
+                    "updated_at": TIMESTAMP,
+                    "variants": [
+                        {"id": variant_id, "title": "Variant", "price": "1.00"}
+                        for variant_id in range(1000, 1050)
+                    ],
+                }
+            ],
+        )
+
+    def order(self, order_id, item_count):
+        return {
+            "id": order_id,
+            "total_price": "10.00",
+            "currency": "USD",
+            "created_at": TIMESTAMP,
+            "updated_at": TIMESTAMP,
+            "line_items": [
+                {"variant_id": 1000 + i, "quantity": 1, "price": "1.00"}
+                for i in range(item_count)
+            ],
+        }
+
+    def test_query_count_does_not_grow_with_line_items(self):
+        counts = {}
+        for order_id, item_count in enumerate([2, 10, 50], start=1):
+            with CaptureQueriesContext(connection) as queries:
+                save_orders_page(self.tenant, [self.order(order_id, item_count)])
+            counts[item_count] = len(queries)
+            self.assertEqual(
+                OrderItem.objects.filter(order__shopify_order_id=order_id).count(),
+                item_count,
+            )
+
+        self.assertEqual(counts[2], counts[10], counts)
+        self.assertEqual(counts[2], counts[50], counts)
+
+    def test_stale_payload_does_not_overwrite_line_items(self):
+        newer = dict(self.order(1, 1), updated_at="2025-01-16T10:00:00Z")
+        newer["line_items"][0]["quantity"] = 5
+        save_orders_page(self.tenant, [newer])
+
+        save_orders_page(self.tenant, [self.order(1, 1)])
+
+        item = OrderItem.objects.get(order__shopify_order_id=1)
+        self.assertEqual(item.quantity, 5)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ShopifyRateLimiterTest(SimpleTestCase):
+    def limiter(self, capacity=40, leak_rate=2):
+        self.clock = FakeClock()
+        return ShopifyRateLimiter(
+            "shop.myshopify.com",
+            capacity=capacity,
+            leak_rate=leak_rate,
+            clock=self.clock,
+            sleep=self.clock.sleep,
+            store=LocalBucketStore(),
+        )
+
+    def test_full_bucket_then_leak_rate_spacing(self):
+        limiter = self.limiter(capacity=40, leak_rate=2)
+
+        for _ in range(40):
+            limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+
+        for _ in range(3):
+            limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5, 0.5])
+
+    def test_retry_after_backs_off(self):
+        limiter = self.limiter()
+        limiter.acquire()
+        started = self.clock.now
+
+        limiter.update_from_headers({"Retry-After": "2.0"})
+        limiter.acquire()
+
+        self.assertGreaterEqual(self.clock.now - started, 2.0)
+
+    def test_call_limit_header_tightens_bucket(self):
+        limiter = self.limiter(capacity=80, leak_rate=2)
+
+        limiter.update_from_headers({"X-Shopify-Shop-Api-Call-Limit": "39/40"})
+        self.assertEqual(limiter.capacity, 40)
+
+        limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+        limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [0.5])
+
+
+@override_settings(SHOPIFY_SESSION_CACHE_SIZE=2)
+class GetSessionTest(SimpleTestCase):
+    def setUp(self):
+        sessions.clear()
+
+    def test_least_recently_used_session_is_closed_and_evicted(self):
+        first = get_session("a.myshopify.com")
+        get_session("b.myshopify.com")
+        get_session("a.myshopify.com")
+        get_session("c.myshopify.com")
+
+        self.assertEqual(list(sessions), ["a.myshopify.com", "c.myshopify.com"])
+        self.assertIs(get_session("a.myshopify.com"), first)
+
+
+class FakeShopifyClient:
+    pages = []
+    requests = []
+
+    def __init__(self, shop_domain, access_token=None):
+        pass
+
+    def paginate(self, path, key, params=None, start_url=None):
+        self.requests.append((params, start_url))
+        for page in self.pages:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+
+
+@override_settings(SHOPIFY_PREFETCH_PAGES=0)
+class SyncResourceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+
+    def setUp(self):
+        patcher = mock.patch("store.utils.ShopifyClient", FakeShopifyClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        FakeShopifyClient.requests = []
+
+    def customer(self, customer_id, updated_at):
+        return {
+            "id": customer_id,
+            "created_at": TIMESTAMP,
+            "updated_at": updated_at.isoformat(),
+        }
+
+    def test_cursor_moves_to_run_start_not_newest_record(self):
+        started = timezone.now()
+        FakeShopifyClient.pages = [
+            ([self.customer(1, started - timedelta(days=1))], "page-2"),
+            ([self.customer(2, started + timedelta(hours=1))], None),
+        ]
+
+        sync_resource(self.tenant, "customers")
+
+        cursor = SyncCursor.objects.get(tenant=self.tenant, resource="customers")
+        self.assertEqual(cursor.status, "idle")
+        self.assertLessEqual(cursor.last_updated_at, started)
+        self.assertGreaterEqual(cursor.last_updated_at, started - timedelta(minutes=10))
+
+    @override_settings(SHOPIFY_PREFETCH_PAGES=2)
+    def test_network_error_fails_cursor_at_last_checkpoint(self):
+        FakeShopifyClient.pages = [
+            ([self.customer(1, timezone.now())], "page-2"),
+            requests.ConnectTimeout("timed out"),
+        ]
+
+        sync_resource(self.tenant, "customers")
+
+        cursor = SyncCursor.objects.get(tenant=self.tenant, resource="customers")
+        self.assertEqual(cursor.status, "failed")
+        self.assertEqual(cursor.next_url, "page-2")
+        self.assertEqual(cursor.synced_count, 1)
+
+    def test_full_resync_ignores_incremental_checkpoint(self):
+        SyncCursor.objects.create(
+            tenant=self.tenant,
+            resource="customers",
+            status="failed",
+            last_updated_at=timezone.now(),
+            next_url="https://shop.myshopify.com/customers.json?page_info=old",
+            synced_count=250,
+        )
+        FakeShopifyClient.pages = [([self.customer(1, timezone.now())], None)]
+
+        sync_resource(self.tenant, "customers", full_resync=True)
+
+        self.assertEqual(FakeShopifyClient.requests, [({}, None)])
+        cursor = SyncCursor.objects.get(tenant=self.tenant, resource="customers")
+        self.assertEqual(cursor.synced_count, 1)
+
+
+class SaveEmbeddedCustomersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+
+    def test_stub_without_updated_at_does_not_overwrite_customer(self):
+        save_customers_page(
+            self.tenant,
+            [
+                {
+                    "id": 7,
+                    "first_name": "Ada",
+                    "created_at": TIMESTAMP,
+                    "updated_at": TIMESTAMP,
+                }
+            ],
+        )
+
+        ids = save_embedded_customers(self.tenant, [{"id": 7}, {"id": 8}])
+
+        self.assertEqual(set(ids), {7, 8})
+        self.assertEqual(
+            Customer.objects.get(tenant=self.tenant, shopify_customer_id=7).first_name,
+            "Ada",
+        )
+
+    def test_real_payload_replaces_stub(self):
+        save_embedded_customers(self.tenant, [{"id": 9}])
+        save_customers_page(
+            self.tenant,
+            [
+                {
+                    "id": 9,
+                    "first_name": "Grace",
+                    "created_at": TIMESTAMP,
+                    "updated_at": TIMESTAMP,
+                }
+            ],
+        )
+
+        self.assertEqual(
+            Customer.objects.get(tenant=self.tenant, shopify_customer_id=9).first_name,
+            "Grace",
+        )
+
+
+class DailyStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+
+    def order(self, order_id, total_price, currency="USD", created_at=TIMESTAMP):
+        return {
+            "id": order_id,
+            "total_price": total_price,
+            "currency": currency,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "line_items": [],
+        }
+
+    def stats(self, day):
+        return TenantDailyStats.objects.get(tenant=self.tenant, date=day)
+
+    def test_revenue_is_split_by_currency(self):
+        save_orders_page(
+            self.tenant,
+            [
+                self.order(1, "10.00"),
+                self.order(2, "5.50"),
+                self.order(3, "7.25", currency="EUR"),
+            ],
+        )
+
+        stats = self.stats(date(2025, 1, 15))
+        self.assertEqual(stats.orders_count, 3)
+        self.assertEqual(stats.revenue, Decimal("22.75"))
+        self.assertEqual(stats.revenue_by_currency, {"USD": "15.50", "EUR": "7.25"})
+
+    @override_settings(TIME_ZONE="America/New_York")
+    def test_days_are_bucketed_in_local_time(self):
+        save_orders_page(
+            self.tenant, [self.order(1, "10.00", created_at="2025-01-15T02:00:00Z")]
+        )
+
+        self.assertEqual(self.stats(date(2025, 1, 14)).orders_count, 1)
+        self.assertFalse(
+            TenantDailyStats.objects.filter(
+                tenant=self.tenant, date=date(2025, 1, 15), orders_count__gt=0
+            ).exists()
+        )
+
+    def test_order_update_and_delete_move_the_counts(self):
+        save_orders_page(self.tenant, [self.order(1, "10.00")])
+        order = Order.objects.get(tenant=self.tenant, shopify_order_id=1)
+
+        response = self.client.patch(
+            f"/api/orders/{order.id}/",
+            {"created_at": "2025-01-16T10:00:00Z", "total_price": "12.00"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stats(date(2025, 1, 15)).orders_count, 0)
+        self.assertEqual(self.stats(date(2025, 1, 16)).revenue, Decimal("12.00"))
+
+        response = self.client.delete(f"/api/orders/{order.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.stats(date(2025, 1, 16)).orders_count, 0)
+
+    def test_customer_delete_refreshes_new_customers(self):
+        save_customers_page(
+            self.tenant,
+            [{"id": 7, "created_at": TIMESTAMP, "updated_at": TIMESTAMP}],
+        )
+        self.assertEqual(self.stats(date(2025, 1, 15)).new_customers, 1)
+        customer = Customer.objects.get(tenant=self.tenant, shopify_customer_id=7)
+
+        response = self.client.delete(f"/api/customers/{customer.id}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.stats(date(2025, 1, 15)).new_customers, 0)
+
+    def test_order_webhook_counts_embedded_customer(self):
+        apply_orders(
+            self.tenant,
+            [("orders/create", dict(self.order(1, "10.00"), customer={"id": 7}))],
+        )
+
+        self.assertEqual(self.stats(timezone.localdate()).new_customers, 1)
+
+
+class PendingOrderItemTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+
+    def setUp(self):
+        save_orders_page(
+            self.tenant,
+            [
+                {
+                    "id": 1,
+                    "total_price": "3.00",
+                    "currency": "USD",
+                    "created_at": TIMESTAMP,
+                    "updated_at": TIMESTAMP,
+                    "line_items": [
+                        {"variant_id": 2000, "quantity": 1, "price": "1.00"},
+                        {"variant_id": 3000, "quantity": 2, "price": "1.00"},
+                    ],
+                }
+            ],
+        )
+
+    def test_product_webhook_links_only_its_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_products(
+                self.tenant,
+                [
+                    (
+                        "products/create",
+                        {
+                            "id": 1,
+                            "title": "Product",
+                            "created_at": TIMESTAMP,
+                            "updated_at": TIMESTAMP,
+                            "variants": [{"id": 2000, "price": "1.00"}],
+                        },
+                    )
+                ],
+            )
+
+        self.assertEqual(
+            list(
+                OrderItem.objects.values_list("product__shopify_product_id", flat=True)
+            ),
+            [2000],
+        )
+        self.assertEqual(
+            list(PendingOrderItem.objects.values_list("variant_id", flat=True)), [3000]
+        )
+
+    def test_prune_drops_items_past_retention(self):
+        PendingOrderItem.objects.filter(variant_id=2000).update(
+            created_at=timezone.now() - timedelta(days=31)
+        )
+
+        self.assertEqual(prune_pending_order_items(retention_days=30), 1)
+        self.assertEqual(
+            list(PendingOrderItem.objects.values_list("variant_id", flat=True)), [3000]
+        )
+
+
+class SyncLockTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch("store.sync_lock.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_release_only_deletes_own_lock(self):
+        self.assertTrue(acquire_sync_lock(self.tenant.id, "backfill", "task-1", 60))
+        self.assertFalse(acquire_sync_lock(self.tenant.id, "backfill", "task-2", 60))
+
+        release_sync_lock(self.tenant.id, "backfill", "task-2")
+        self.assertTrue(is_sync_running(self.tenant.id))
+
+        release_sync_lock(self.tenant.id, "backfill", "task-1")
+        self.assertFalse(is_sync_running(self.tenant.id))
+
+    def test_refresh_extends_held_lock(self):
+        acquire_sync_lock(self.tenant.id, "backfill", "task-1", 60)
+
+        self.assertTrue(refresh_sync_lock(self.tenant.id, "backfill", 3600))
+
+        self.assertGreater(self.redis.ttl(f"sync-lock:backfill:{self.tenant.id}"), 60)
+
+    def test_resync_reports_running_sync_instead_of_queueing(self):
+        acquire_sync_lock(self.tenant.id, "backfill", "task-1", 60)
+        out = StringIO()
+
+        with mock.patch(
+            "store.management.commands.resync_tenant.fetch_existing_data_task"
+        ) as task:
+            call_command("resync_tenant", self.tenant.shopify_domain, stdout=out)
+
+        task.delay.assert_not_called()
+        self.assertIn("already running", out.getvalue())
+
+
+class ImportShopifyNdjsonTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+        save_products_page(
+            cls.tenant,
+            [
+                {
+                    "id": 1,
+                    "title": "Product",
+                    "created_at": TIMESTAMP,
+                    "updated_at": TIMESTAMP,
+                    "variants": [{"id": 2000, "title": "Variant", "price": "4.00"}],
+                }
+            ],
+        )
+
+    def import_lines(self, resource, lines, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as export:
+            export.write("\n".join(json.dumps(line) for line in lines))
+            export.flush()
+            call_command(
+                "import_shopify_ndjson",
+                self.tenant.shopify_domain,
+                resource,
+                export.name,
+                *args,
+                stdout=StringIO(),
+            )
+
+    def test_bulk_operation_orders_are_mapped(self):
+        self.import_lines(
+            "orders",
+            [
+                {
+                    "id": "gid://shopify/Order/10",
+                    "createdAt": TIMESTAMP,
+                    "updatedAt": TIMESTAMP,
+                    "currencyCode": "EUR",
+                    "displayFinancialStatus": "PAID",
+                    "totalPriceSet": {
+                        "shopMoney": {"amount": "8.00", "currencyCode": "EUR"}
+                    },
+                    "customer": {"id": "gid://shopify/Customer/7"},
+                },
+                {
+                    "id": "gid://shopify/LineItem/11",
+                    "quantity": 2,
+                    "variant": {"id": "gid://shopify/ProductVariant/2000"},
+                    "originalUnitPriceSet": {"shopMoney": {"amount": "4.00"}},
+                    "__parentId": "gid://shopify/Order/10",
+                },
+            ],
+        )
+
+        order = Order.objects.get(tenant=self.tenant, shopify_order_id=10)
+        self.assertEqual(order.total_price, Decimal("8.00"))
+        self.assertEqual(order.currency, "EUR")
+        self.assertEqual(order.financial_status, "paid")
+        self.assertEqual(order.customer.shopify_customer_id, 7)
+        item = order.items.get()
+        self.assertEqual(item.product.shopify_product_id, 2000)
+        self.assertEqual((item.quantity, item.price), (2, Decimal("4.00")))
+
+    def test_unsupported_record_is_rejected_before_writing(self):
+        valid = {
+            "id": "gid://shopify/Customer/1",
+            "createdAt": TIMESTAMP,
+            "updatedAt": TIMESTAMP,
+        }
+        with self.assertRaisesMessage(CommandError, "Line 2"):
+            self.import_lines(
+                "customers",
+                [valid, {"id": "gid://shopify/Customer/2", "createdAt": TIMESTAMP}],
+                "--batch-size",
+                "1",
+            )
+
+        self.assertFalse(Customer.objects.filter(tenant=self.tenant).exists())
+
+
+class CoalesceTest(SimpleTestCase):
+    def test_older_payload_arriving_later_is_dropped(self):
+        newer = {"id": 1, "updated_at": "2025-01-15T11:00:00Z"}
+        older = {"id": 1, "updated_at": "2025-01-15T10:00:00Z"}
+        other = {"id": 2, "updated_at": TIMESTAMP}
+
+        webhooks = coalesce(
+            "orders",
+            [
+                ("orders/updated", newer),
+                ("orders/create", other),
+                ("orders/updated", older),
+            ],
+        )
+
+        self.assertEqual(
+            webhooks, [("orders/updated", newer), ("orders/create", other)]
+        )
+
+    def test_newer_payload_moves_to_its_arrival_position(self):
+        first = {"id": 1, "updated_at": TIMESTAMP}
+        other = {"id": 2, "updated_at": TIMESTAMP}
+        second = {"id": 1, "updated_at": "2025-01-15T11:00:00Z"}
+
+        webhooks = coalesce(
+            "customers",
+            [
+                ("customers/update", first),
+                ("customers/update", other),
+                ("customers/update", second),
+            ],
+        )
+
+        self.assertEqual(
+            webhooks, [("customers/update", other), ("customers/update", second)]
+        )
+
+    def test_checkout_events_are_kept_per_topic(self):
+        created = {"id": 5, "updated_at": TIMESTAMP}
+        updated = {"id": 5, "updated_at": "2025-01-15T11:00:00Z"}
+
+        webhooks = coalesce(
+            "custom-events",
+            [("checkouts/create", created), ("checkouts/update", updated)],
+        )
+
+        self.assertEqual(
+            webhooks, [("checkouts/create", created), ("checkouts/update", updated)]
+        )
+
+
+@override_settings(WEBHOOK_STREAM="test-webhooks")
+class ProcessMessagesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        self.redis.xgroup_create("test-webhooks", GROUP, id="0", mkstream=True)
+
+    def deliver(self, *customers):
+        for customer in customers:
+            self.redis.xadd(
+                "test-webhooks",
+                {
+                    "tenant_id": self.tenant.id,
+                    "kind": "customers",
+                    "topic": "customers/update",
+                    "body": json.dumps(customer),
+                },
+            )
+        return self.redis.xreadgroup(GROUP, "test", {"test-webhooks": ">"})[0][1]
+
+    def customer(self, customer_id, first_name, updated_at=TIMESTAMP):
+        return {
+            "id": customer_id,
+            "first_name": first_name,
+            "created_at": TIMESTAMP,
+            "updated_at": updated_at,
+        }
+
+    def test_batch_is_coalesced_and_acknowledged(self):
+        process_messages(
+            self.redis,
+            self.deliver(
+                self.customer(1, "New", "2025-01-15T11:00:00Z"),
+                self.customer(1, "Old"),
+                self.customer(2, "Other"),
+            ),
+        )
+
+        self.assertEqual(
+            dict(Customer.objects.values_list("shopify_customer_id", "first_name")),
+            {1: "New", 2: "Other"},
+        )
+        self.assertEqual(self.redis.xpending("test-webhooks", GROUP)["pending"], 0)
+        metrics = self.redis.hgetall("test-webhooks:metrics")
+        self.assertEqual(metrics[b"messages"], b"3")
+        self.assertEqual(metrics[b"applied"], b"2")
+
+    def test_failed_batch_falls_back_to_single_messages(self):
+        bad = dict(self.customer(None, "Bad"), created_at=None)
+
+        with self.assertLogs(level="ERROR"):
+            process_messages(self.redis, self.deliver(self.customer(1, "Good"), bad))
+
+        self.assertEqual(
+            list(Customer.objects.values_list("first_name", flat=True)), ["Good"]
+        )
+        pending = self.redis.xpending_range("test-webhooks", GROUP, "-", "+", 10)
+        self.assertEqual(len(pending), 1)
+        metrics = self.redis.hgetall("test-webhooks:metrics")
+        self.assertEqual((metrics[b"applied"], metrics[b"failed"]), (b"1", b"1"))
+
+
+class RollupCustomEventsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="owner", email="owner@example.com", password="x"
+        )
+        cls.tenant = Tenant.objects.create(
+            user=user, name="Shop", shopify_domain="shop.myshopify.com"
+        )
+
+    def event(self, days_ago, cart_value="10.00"):
+        event = CustomEvent.objects.create(
+            tenant=self.tenant, event_type="checkout_started", cart_value=cart_value
+        )
+        CustomEvent.objects.filter(id=event.id).update(
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return event
+
+    def rollup(self):
+        return CustomEventDailyRollup.objects.get(
+            tenant=self.tenant,
+            date=timezone.localdate() - timedelta(days=100),
+            event_type="checkout_started",
+        )
+
+    def test_rollup_is_not_doubled_by_reruns(self):
+        self.event(100)
+        self.event(100, "5.00")
+        recent = self.event(10)
+
+        self.assertEqual(rollup_custom_events(retention_days=90), 2)
+        self.assertEqual(rollup_custom_events(retention_days=90), 0)
+
+        rollup = self.rollup()
+        self.assertEqual((rollup.count, rollup.cart_value), (2, Decimal("15.00")))
+        self.assertEqual(list(CustomEvent.objects.all()), [recent])
+
+    def test_late_events_add_to_existing_rollup(self):
+        self.event(100)
+        rollup_custom_events(retention_days=90)
+
+        self.event(100, "2.50")
+        rollup_custom_events(retention_days=90)
+
+        rollup = self.rollup()
+        self.assertEqual((rollup.count, rollup.cart_value), (2, Decimal("12.50")))
+        self.assertFalse(CustomEvent.objects.exists())
+
+
+class TenantViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            user = get_user_model().objects.create_user(
+                username=f"owner{i}", email=f"owner{i}@example.com", password="x"
+            )
+            Tenant.objects.create(
+                user=user, name="Shop", shopify_domain=f"shop{i}.myshopify.com"
+            )
+
+    def test_list_does_not_query_per_tenant(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/tenants/")
+
+        self.assertEqual(len(response.json()), 3)
+        self.assertNotIn("order_backfill", response.json()[0])
+
+    def test_detail_reports_sync_status(self):
+        tenant = Tenant.objects.first()
+
+        response = self.client.get(f"/api/tenants/{tenant.id}/")
+
+        self.assertFalse(response.json()["sync_running"])
+        self.assertEqual(response.json()["order_backfill"]["windows"], 0)
@@ -11,4 +11,5 @@ urlpatterns = [
     path('orders/', views.OrderListCreateView.as_view(), name='order-list-create'),
     path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('custom-events/', views.CustomEventListCreateView.as_view(), name='custom-event-list-create'),
+    path('webhooks/<str:kind>/', views.webhook_receiver, name='webhook-receiver'),
 ]
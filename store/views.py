@@ -1,4 +1,6 @@
-from django.utils import timezone
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -7,12 +9,12 @@ from .models import (
     Customer,
     Product,
     Order,
-    OrderItem,
     CustomEvent,
     WebhookSubscription,
 )
 from .serializers import (
     TenantSerializer,
+    TenantDetailSerializer,
     CustomerSerializer,
     ProductSerializer,
     OrderReadSerializer,
@@ -20,8 +22,84 @@ from .serializers import (
     CustomEventSerializer,
     WebhookSubscriptionSerializer,
 )
-from django.db import transaction
+from .data_version import bump_data_version
 from .tasks import fetch_existing_data_task, subscribe_to_webhooks_task
+from .tenant_cache import (
+    aget_tenant_for_domain,
+    get_tenant_for_domain,
+    get_tenant_for_user,
+)
+from .utils import local_dates, refresh_customer_aggregates, refresh_daily_stats
+from .webhooks import (
+    APPLIERS,
+    aclaim_delivery,
+    aenqueue_webhook,
+    arelease_delivery,
+    claim_delivery,
+    enqueue_webhook,
+    release_delivery,
+)
+
+
+def queue_webhook(request, kind):
+    shopify_domain = request.headers.get("X-Shopify-Shop-Domain")
+    webhook_id = request.headers.get("X-Shopify-Webhook-Id")
+
+    # Shopify delivers at least once; drop retries of a delivery we already
+    # queued before touching the database.
+    if not claim_delivery(shopify_domain, webhook_id):
+        return Response({"status": "duplicate"}, status=status.HTTP_200_OK)
+
+    tenant = get_tenant_for_domain(shopify_domain)
+    if tenant is None:
+        release_delivery(webhook_id)
+        return Response(
+            {"error": f"Tenant with domain {shopify_domain} not found."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        enqueue_webhook(
+            tenant, kind, request.headers.get("X-Shopify-Topic"), request.body
+        )
+    except Exception:
+        release_delivery(webhook_id)
+        raise
+    return Response({"status": "queued"}, status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+@require_POST
+async def webhook_receiver(request, kind):
+    """Async webhook endpoint: dedupe, resolve the tenant and queue the body.
+
+    Only awaits Redis and, on a tenant cache miss, one indexed query, so a
+    single ASGI worker can hold many slow deliveries open at once.
+    """
+    if kind not in APPLIERS:
+        return JsonResponse({"error": f"Unknown webhook kind {kind}."}, status=404)
+
+    shopify_domain = request.headers.get("X-Shopify-Shop-Domain")
+    webhook_id = request.headers.get("X-Shopify-Webhook-Id")
+
+    if not await aclaim_delivery(shopify_domain, webhook_id):
+        return JsonResponse({"status": "duplicate"})
+
+    tenant = await aget_tenant_for_domain(shopify_domain)
+    if tenant is None:
+        await arelease_delivery(webhook_id)
+        return JsonResponse(
+            {"error": f"Tenant with domain {shopify_domain} not found."}, status=400
+        )
+
+    try:
+        await aenqueue_webhook(
+            tenant.id, kind, request.headers.get("X-Shopify-Topic"), request.body
+        )
+    except Exception:
+        await arelease_delivery(webhook_id)
+        raise
+    return JsonResponse({"status": "queued"})
 
 
 class TenantListCreateView(generics.ListCreateAPIView):
@@ -38,7 +116,7 @@ class TenantListCreateView(generics.ListCreateAPIView):
 
 class TenantDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Tenant.objects.all()
-    serializer_class = TenantSerializer
+    serializer_class = TenantDetailSerializer
 
 
 class CustomerListCreateView(generics.ListCreateAPIView):
@@ -46,107 +124,42 @@ class CustomerListCreateView(generics.ListCreateAPIView):
     serializer_class = CustomerSerializer
 
     def create(self, request, *args, **kwargs):
-        shopify_data = request.data
-        shopify_domain = request.headers.get("X-Shopify-Shop-Domain")
-
-        try:
-            tenant = Tenant.objects.get(shopify_domain=shopify_domain)
-        except Tenant.DoesNotExist:
-            return Response(
-                {"error": f"Tenant with domain {shopify_domain} not found."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        default_address_data = shopify_data.get("default_address", {})
-
-        customer, created = Customer.objects.update_or_create(
-            shopify_customer_id=shopify_data.get("id"),
-            tenant=tenant,
-            defaults={
-                "first_name": shopify_data.get("first_name"),
-                "last_name": shopify_data.get("last_name"),
-                "email": shopify_data.get("email"),
-                "phone": shopify_data.get("phone") or default_address_data.get("phone"),
-                "address1": default_address_data.get("address1"),
-                "address2": default_address_data.get("address2"),
-                "city": default_address_data.get("city"),
-                "province": default_address_data.get("province"),
-                "country": default_address_data.get("country"),
-                "zip": default_address_data.get("zip"),
-                "company": default_address_data.get("company"),
-                "created_at": shopify_data.get("created_at"),
-                "updated_at": shopify_data.get("updated_at"),
-            },
-        )
-
-        serializer = self.get_serializer(customer)
-        headers = self.get_success_headers(serializer.data)
-        status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
-
-        return Response(serializer.data, status=status_code, headers=headers)
+        return queue_webhook(request, "customers")
 
 
 class CustomerDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
 
+    def perform_update(self, serializer):
+        previous_created_at = serializer.instance.created_at
+        customer = serializer.save()
+        refresh_daily_stats(
+            customer.tenant, local_dates([previous_created_at, customer.created_at])
+        )
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        refresh_daily_stats(instance.tenant, local_dates([instance.created_at]))
+        bump_data_version(instance.tenant_id)
+
 
 class ProductListCreateView(generics.ListCreateAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
     def create(self, request, *args, **kwargs):
-        shopify_data = request.data
-        variants = shopify_data.get("variants")
-
-        if not variants:
-            return Response(
-                {"error": "Product has no variants."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        shopify_domain = request.headers.get("X-Shopify-Shop-Domain")
-
-        try:
-            tenant = Tenant.objects.get(shopify_domain=shopify_domain)
-        except Tenant.DoesNotExist:
-            return Response(
-                {"error": f"Tenant with domain {shopify_domain} not found."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        created_products = []
-
-        for variant in variants:
-            product, created = Product.objects.update_or_create(
-                shopify_product_id=variant.get("id"),
-                tenant=tenant,
-                defaults={
-                    "title": f"{shopify_data.get('title')} - {variant.get('title')}",
-                    "description": shopify_data.get("body_html"),
-                    "price": variant.get("price"),
-                    "sku": variant.get("sku"),
-                    "inventory_quantity": variant.get("inventory_quantity", 0),
-                    "created_at": shopify_data.get("created_at")
-                    or shopify_data.get("published_at"),
-                    "updated_at": variant.get("updated_at")
-                    or shopify_data.get("updated_at"),
-                },
-            )
-
-            serializer = self.get_serializer(product)
-            created_products.append(serializer.data)
-
-        headers = self.get_success_headers(created_products)
-        return Response(
-            created_products, status=status.HTTP_201_CREATED, headers=headers
-        )
+        return queue_webhook(request, "products")
 
 
 class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        bump_data_version(instance.tenant_id)
+
 
 class OrderListCreateView(generics.ListCreateAPIView):
     queryset = Order.objects.all()
@@ -157,80 +170,7 @@ class OrderListCreateView(generics.ListCreateAPIView):
         return OrderReadSerializer
 
     def create(self, request, *args, **kwargs):
-        shopify_data = request.data
-        shopify_domain = request.headers.get("X-Shopify-Shop-Domain")
-
-        try:
-            tenant = Tenant.objects.get(shopify_domain=shopify_domain)
-        except Tenant.DoesNotExist:
-            return Response(
-                {"error": f"Tenant with domain {shopify_domain} not found."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        try:
-            with transaction.atomic():
-                customer_data = shopify_data.get("customer")
-                customer = None
-
-                if customer_data:
-                    customer, _ = Customer.objects.update_or_create(
-                        shopify_customer_id=customer_data.get("id"),
-                        tenant=tenant,
-                        defaults={
-                            "first_name": customer_data.get("first_name"),
-                            "last_name": customer_data.get("last_name"),
-                            "email": customer_data.get("email"),
-                            "phone": customer_data.get("phone"),
-                            "created_at": customer_data.get("created_at")
-                            or timezone.now(),
-                            "updated_at": customer_data.get("updated_at")
-                            or timezone.now(),
-                        },
-                    )
-
-                order, created = Order.objects.update_or_create(
-                    shopify_order_id=shopify_data.get("id"),
-                    tenant=tenant,
-                    defaults={
-                        "customer": customer,
-                        "total_price": shopify_data.get("total_price"),
-                        "currency": shopify_data.get("currency"),
-                        "financial_status": shopify_data.get("financial_status"),
-                        "fulfillment_status": shopify_data.get("fulfillment_status"),
-                        "created_at": shopify_data.get("created_at"),
-                        "updated_at": shopify_data.get("updated_at"),
-                    },
-                )
-
-                for item_data in shopify_data.get("line_items", []):
-                    variant_id = item_data.get("variant_id")
-                    product = Product.objects.filter(
-                        shopify_product_id=variant_id
-                    ).first()
-
-                    if not product:
-                        raise Exception(
-                            f"Product with variant_id {variant_id} not found."
-                        )
-
-                    OrderItem.objects.update_or_create(
-                        order=order,
-                        product=product,
-                        defaults={
-                            "quantity": item_data.get("quantity"),
-                            "price": item_data.get("price"),
-                        },
-                    )
-
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-        serializer = OrderReadSerializer(order)
-        headers = self.get_success_headers(serializer.data)
-        status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
-
-        return Response(serializer.data, status=status_code, headers=headers)
+        return queue_webhook(request, "orders")
 
 
 class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -241,62 +181,31 @@ class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
             return OrderWriteSerializer
         return OrderReadSerializer
 
+    def perform_update(self, serializer):
+        previous_customer_id = serializer.instance.customer_id
+        previous_created_at = serializer.instance.created_at
+        order = serializer.save()
+        refresh_customer_aggregates(
+            Customer.objects.filter(id__in=[previous_customer_id, order.customer_id])
+        )
+        refresh_daily_stats(
+            order.tenant, local_dates([previous_created_at, order.created_at])
+        )
+
+    def perform_destroy(self, instance):
+        customer_id = instance.customer_id
+        instance.delete()
+        refresh_customer_aggregates(Customer.objects.filter(id=customer_id))
+        refresh_daily_stats(instance.tenant, local_dates([instance.created_at]))
+        bump_data_version(instance.tenant_id)
+
 
 class CustomEventListCreateView(generics.ListCreateAPIView):
     queryset = CustomEvent.objects.all()
     serializer_class = CustomEventSerializer
 
     def create(self, request, *args, **kwargs):
-        shopify_data = request.data
-        shopify_domain = request.headers.get("X-Shopify-Shop-Domain")
-        webhook_topic = request.headers.get("X-Shopify-Topic")
-
-        try:
-            tenant = Tenant.objects.get(shopify_domain=shopify_domain)
-        except Tenant.DoesNotExist:
-            return Response(
-                {"error": f"Tenant with domain {shopify_domain} not found."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        event_type = "unknown"
-
-        if webhook_topic == "checkouts/create":
-            event_type = "checkout_started"
-        elif webhook_topic == "checkouts/update":
-            event_type = "checkout_updated"
-        elif webhook_topic == "checkouts/delete":
-            event_type = "checkout_deleted"
-
-        customer_data = shopify_data.get("customer")
-        customer = None
-
-        if customer_data:
-            customer, _ = Customer.objects.update_or_create(
-                shopify_customer_id=customer_data.get("id"),
-                tenant=tenant,
-                defaults={
-                    "first_name": customer_data.get("first_name"),
-                    "last_name": customer_data.get("last_name"),
-                    "email": customer_data.get("email"),
-                    "phone": customer_data.get("phone"),
-                    "created_at": customer_data.get("created_at") or timezone.now(),
-                    "updated_at": customer_data.get("updated_at") or timezone.now(),
-                },
-            )
-
-        event = CustomEvent.objects.create(
-            tenant=tenant,
-            event_type=event_type,
-            customer=customer,
-            metadata=shopify_data,
-        )
-
-        serializer = self.get_serializer(event)
-        headers = self.get_success_headers(serializer.data)
-        return Response(
-            serializer.data, status=status.HTTP_201_CREATED, headers=headers
-        )
+        return queue_webhook(request, "custom-events")
 
 
 class WebhookSubscriptionDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -304,8 +213,7 @@ class WebhookSubscriptionDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = WebhookSubscriptionSerializer
 
     def get_queryset(self):
-        tenant = getattr(self.request.user, "tenant", None)
+        tenant = get_tenant_for_user(self.request.user)
         if tenant:
             return WebhookSubscription.objects.filter(tenant=tenant)
         return WebhookSubscription.objects.none()
-
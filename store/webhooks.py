@@ -0,0 +1,435 @@
+import asyncio
+import json
+import logging
+import time
+import weakref
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+from redis import asyncio as aioredis
+
+from .data_version import bump_data_version
+from .events import event_fields
+from .models import Customer, CustomEvent, PendingOrderItem, Tenant
+from .tasks import link_pending_order_items_task
+from .utils import (
+    local_dates,
+    map_order_customer,
+    refresh_daily_stats,
+    save_customers_page,
+    save_orders_page,
+    save_products_page,
+    upsert_newer,
+)
+
+GROUP = "webhook-appliers"
+
+STUB_UPDATED_AT = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+CHECKOUT_EVENT_TYPES = {
+    "checkouts/create": "checkout_started",
+    "checkouts/update": "checkout_updated",
+    "checkouts/delete": "checkout_deleted",
+}
+
+
+def get_stream():
+    return get_redis_connection("default")
+
+
+# redis.asyncio connections belong to the event loop that opened them, so the
+# async views keep one client per loop.
+async_streams = weakref.WeakKeyDictionary()
+
+
+def get_async_stream():
+    loop = asyncio.get_running_loop()
+    if loop not in async_streams:
+        async_streams[loop] = aioredis.from_url(settings.CACHES["default"]["LOCATION"])
+    return async_streams[loop]
+
+
+def delivery_key(webhook_id):
+    return f"webhook-delivery:{webhook_id}"
+
+
+def duplicates_key():
+    return f"{settings.WEBHOOK_STREAM}:duplicates"
+
+
+def claim_delivery(shopify_domain, webhook_id):
+    """Return False if this delivery was already accepted, counting the duplicate.
+
+    Deliveries without an ID cannot be deduplicated and are always accepted.
+    """
+    if not webhook_id:
+        return True
+
+    redis = get_stream()
+    if redis.set(delivery_key(webhook_id), 1, nx=True, ex=settings.WEBHOOK_DEDUPE_TTL):
+        return True
+
+    redis.hincrby(duplicates_key(), shopify_domain or "", 1)
+    return False
+
+
+async def aclaim_delivery(shopify_domain, webhook_id):
+    if not webhook_id:
+        return True
+
+    redis = get_async_stream()
+    if await redis.set(
+        delivery_key(webhook_id), 1, nx=True, ex=settings.WEBHOOK_DEDUPE_TTL
+    ):
+        return True
+
+    await redis.hincrby(duplicates_key(), shopify_domain or "", 1)
+    return False
+
+
+def release_delivery(webhook_id):
+    """Forget a claimed delivery so Shopify's retry is accepted again."""
+    if webhook_id:
+        get_stream().delete(delivery_key(webhook_id))
+
+
+async def arelease_delivery(webhook_id):
+    if webhook_id:
+        await get_async_stream().delete(delivery_key(webhook_id))
+
+
+def duplicate_counts(redis=None):
+    redis = redis or get_stream()
+    return {
+        shopify_domain.decode(): int(count)
+        for shopify_domain, count in redis.hgetall(duplicates_key()).items()
+    }
+
+
+def webhook_fields(tenant_id, kind, topic, body):
+    return {"tenant_id": tenant_id, "kind": kind, "topic": topic or "", "body": body}
+
+
+def enqueue_webhook(tenant, kind, topic, body):
+    """Queue a raw webhook body for the appliers and return its stream ID."""
+    return get_stream().xadd(
+        settings.WEBHOOK_STREAM,
+        webhook_fields(tenant.id, kind, topic, body),
+        maxlen=settings.WEBHOOK_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+async def aenqueue_webhook(tenant_id, kind, topic, body):
+    return await get_async_stream().xadd(
+        settings.WEBHOOK_STREAM,
+        webhook_fields(tenant_id, kind, topic, body),
+        maxlen=settings.WEBHOOK_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+def save_embedded_customers(tenant, customers):
+    """Upsert the customers embedded in orders and checkouts, returning their IDs.
+
+    Stubs without ``updated_at`` cannot be ordered against the stored row, so
+    they only create customers that do not exist yet, dated so that any real
+    customer payload replaces them.
+    """
+    now = timezone.now()
+    rows = []
+    stubs = []
+    for customer_data in customers:
+        if not customer_data:
+            continue
+        row = dict(
+            map_order_customer(tenant, customer_data),
+            created_at=customer_data.get("created_at") or now,
+        )
+        if row["updated_at"]:
+            rows.append(row)
+        else:
+            stubs.append(Customer(**dict(row, updated_at=STUB_UPDATED_AT)))
+
+    upsert_newer(Customer, rows, ["tenant_id", "shopify_customer_id"])
+    Customer.objects.bulk_create(stubs, ignore_conflicts=True)
+    refresh_daily_stats(
+        tenant,
+        local_dates(row["created_at"] for row in rows)
+        | local_dates(stub.created_at for stub in stubs),
+    )
+    bump_data_version(tenant.id)
+    return dict(
+        Customer.objects.filter(
+            tenant=tenant,
+            shopify_customer_id__in=[row["shopify_customer_id"] for row in rows]
+            + [stub.shopify_customer_id for stub in stubs],
+        ).values_list("shopify_customer_id", "id")
+    )
+
+
+def apply_customers(tenant, webhooks):
+    save_customers_page(tenant, [shopify_data for _, shopify_data in webhooks])
+
+
+def apply_products(tenant, webhooks):
+    products = []
+    for _, shopify_data in webhooks:
+        if not shopify_data.get("variants"):
+            logging.warning(
+                f"Product {shopify_data.get('id')} has no variants, skipping"
+            )
+            continue
+        products.append(shopify_data)
+
+    save_products_page(tenant, products)
+
+    variant_ids = [
+        variant["id"]
+        for product_data in products
+        for variant in product_data["variants"]
+    ]
+    if PendingOrderItem.objects.filter(
+        tenant=tenant, variant_id__in=variant_ids
+    ).exists():
+        transaction.on_commit(
+            lambda: link_pending_order_items_task.delay(tenant.id, variant_ids)
+        )
+
+
+def apply_orders(tenant, webhooks):
+    orders = [shopify_data for _, shopify_data in webhooks]
+    save_embedded_customers(tenant, [order.get("customer") for order in orders])
+    save_orders_page(tenant, orders)
+
+
+def apply_checkouts(tenant, webhooks):
+    customers = [shopify_data.get("customer") or {} for _, shopify_data in webhooks]
+    customer_ids = save_embedded_customers(tenant, customers)
+
+    events = []
+    for topic, shopify_data in webhooks:
+        event_type = CHECKOUT_EVENT_TYPES.get(topic, "unknown")
+        events.append(
+            CustomEvent(
+                tenant=tenant,
+                event_type=event_type,
+                customer_id=customer_ids.get(
+                    (shopify_data.get("customer") or {}).get("id")
+                ),
+                **event_fields(event_type, shopify_data),
+            )
+        )
+    CustomEvent.objects.bulk_create(events)
+
+    refresh_daily_stats(tenant, {timezone.localdate()})
+    bump_data_version(tenant.id)
+
+
+APPLIERS = {
+    "customers": apply_customers,
+    "products": apply_products,
+    "orders": apply_orders,
+    "custom-events": apply_checkouts,
+}
+
+
+def coalesce(kind, webhooks):
+    """Keep only the newest payload per Shopify ID, in arrival order.
+
+    Checkout events are kept per topic so a create and an update for the same
+    checkout both still produce an event.
+    """
+    latest = {}
+    for topic, shopify_data in webhooks:
+        key = shopify_data.get("id")
+        if kind == "custom-events":
+            key = (topic, key)
+        current = latest.get(key)
+        if current is not None:
+            updated_at = parse_datetime(shopify_data.get("updated_at") or "")
+            current_updated_at = parse_datetime(current[1].get("updated_at") or "")
+            if updated_at and current_updated_at and updated_at < current_updated_at:
+                continue
+        latest.pop(key, None)
+        latest[key] = (topic, shopify_data)
+    return list(latest.values())
+
+
+def decode(fields):
+    return fields[b"topic"].decode(), json.loads(fields[b"body"])
+
+
+def apply_batch(tenant_id, kind, messages):
+    """Apply one tenant's messages of one kind as a single transaction.
+
+    Returns the number of payloads left after coalescing.
+    """
+    tenant = Tenant.objects.filter(id=tenant_id).first()
+    if tenant is None:
+        return 0
+
+    webhooks = coalesce(kind, [decode(fields) for _, fields in messages])
+    with transaction.atomic():
+        APPLIERS[kind](tenant, webhooks)
+    return len(webhooks)
+
+
+def ensure_group(redis):
+    try:
+        redis.xgroup_create(settings.WEBHOOK_STREAM, GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def reclaim_stale(redis, consumer):
+    """Take over messages another applier read but never acknowledged.
+
+    Messages that keep failing are moved to the dead-letter stream so they
+    stop blocking the group.
+    """
+    stale = redis.xpending_range(
+        settings.WEBHOOK_STREAM,
+        GROUP,
+        min="-",
+        max="+",
+        count=100,
+        idle=settings.WEBHOOK_CLAIM_IDLE_MS,
+    )
+    if not stale:
+        return []
+
+    dead = [
+        entry["message_id"]
+        for entry in stale
+        if entry["times_delivered"] >= settings.WEBHOOK_MAX_DELIVERIES
+    ]
+    retry = [entry["message_id"] for entry in stale if entry["message_id"] not in dead]
+
+    if dead:
+        for message_id, fields in redis.xclaim(
+            settings.WEBHOOK_STREAM, GROUP, consumer, 0, dead
+        ):
+            redis.xadd(f"{settings.WEBHOOK_STREAM}:dead", fields)
+            logging.error(f"Webhook {message_id} moved to dead-letter stream")
+        redis.xack(settings.WEBHOOK_STREAM, GROUP, *dead)
+
+    if not retry:
+        return []
+    return redis.xclaim(
+        settings.WEBHOOK_STREAM,
+        GROUP,
+        consumer,
+        settings.WEBHOOK_CLAIM_IDLE_MS,
+        retry,
+    )
+
+
+def message_lag_ms(message_id):
+    timestamp = int(message_id.split(b"-")[0])
+    return max(int(time.time() * 1000) - timestamp, 0)
+
+
+def record_metrics(redis, messages, applied, failed):
+    lag_ms = message_lag_ms(messages[0][0])
+    key = f"{settings.WEBHOOK_STREAM}:metrics"
+
+    pipe = redis.pipeline()
+    pipe.hincrby(key, "batches", 1)
+    pipe.hincrby(key, "messages", len(messages))
+    pipe.hincrby(key, "applied", applied)
+    pipe.hincrby(key, "failed", failed)
+    pipe.hset(key, mapping={"last_batch_size": len(messages), "last_lag_ms": lag_ms})
+    pipe.execute()
+
+    logging.info(
+        f"Applied {len(messages)} webhooks as {applied} payloads "
+        f"({failed} failed, lag {lag_ms} ms)"
+    )
+
+
+def webhook_metrics(redis=None):
+    redis = redis or get_stream()
+    metrics = {
+        key.decode(): int(value)
+        for key, value in redis.hgetall(f"{settings.WEBHOOK_STREAM}:metrics").items()
+    }
+    metrics["stream_length"] = redis.xlen(settings.WEBHOOK_STREAM)
+    return metrics
+
+
+def process_messages(redis, messages):
+    if not messages:
+        return
+
+    batches = {}
+    for message_id, fields in messages:
+        key = (int(fields[b"tenant_id"]), fields[b"kind"].decode())
+        batches.setdefault(key, []).append((message_id, fields))
+
+    applied = failed = 0
+    for (tenant_id, kind), batch in batches.items():
+        try:
+            applied += apply_batch(tenant_id, kind, batch)
+            done = [message_id for message_id, _ in batch]
+        except Exception as e:
+            # Retry one by one so a single bad payload only holds back itself.
+            logging.error(f"Failed to apply {kind} batch for tenant {tenant_id}: {e}")
+            done = []
+            for message_id, fields in batch:
+                try:
+                    applied += apply_batch(tenant_id, kind, [(message_id, fields)])
+                    done.append(message_id)
+                except Exception as e:
+                    logging.error(f"Failed to apply webhook {message_id}: {e}")
+                    failed += 1
+
+        if done:
+            redis.xack(settings.WEBHOOK_STREAM, GROUP, *done)
+
+    record_metrics(redis, messages, applied, failed)
+
+
+def read_batch(redis, consumer, block_ms, count):
+    """Read up to ``count`` messages, waiting at most WEBHOOK_BATCH_WAIT_MS
+    after the first one arrives for the batch to fill up."""
+
+    def read(block, limit):
+        response = redis.xreadgroup(
+            GROUP,
+            consumer,
+            {settings.WEBHOOK_STREAM: ">"},
+            count=limit,
+            block=block,
+        )
+        return [message for _, messages in response or [] for message in messages]
+
+    messages = read(block_ms, count)
+    deadline = time.monotonic() + settings.WEBHOOK_BATCH_WAIT_MS / 1000
+
+    while messages and len(messages) < count:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            break
+        more = read(remaining_ms, count - len(messages))
+        if not more:
+            break
+        messages.extend(more)
+
+    return messages
+
+
+def consume_webhooks(consumer, block_ms=5000, count=None):
+    redis = get_stream()
+    ensure_group(redis)
+    count = count or settings.WEBHOOK_BATCH_SIZE
+
+    while True:
+        close_old_connections()
+        process_messages(redis, reclaim_stale(redis, consumer))
+        process_messages(redis, read_batch(redis, consumer, block_ms, count))